@@ -0,0 +1,217 @@
+import os
+import json
+import math
+
+import numpy as np
+
+import PATHS
+import CombinatorialBounds
+
+from InstancesUtils import read_instance
+from MiscUtils import AVAILABLE_MODELS, get_solver_class, run_score
+from SharedDistances import as_distance_matrix
+
+SELECTOR_FILE = os.path.join(PATHS.AUTO_SELECTION_FOLDER, "selector.json")
+
+# Increase when the layout of the selector state changes (older states are discarded).
+SELECTOR_FORMAT_VERSION = 3
+
+FEATURES = [
+    "log_n", "P", "d", "cluster_size_mean", "cluster_size_cv", "cluster_size_max",
+    "distance_cv", "feasible_arcs", "bound_gap"
+]
+
+# Used while the history has no run similar to the instance.
+DEFAULT_SOLVER = "H2020"
+
+NEIGHBOURS = 5
+
+def compute_features(data):
+    """Cheap features of an instance: size, clusters, distance statistics and the gap between
+    the assignment bound (the LP relaxation of the base model) and a heuristic route."""
+    D = as_distance_matrix(data["distances"])
+    n = len(D)
+    P = len(data["V_P"])
+    d = data["d"]
+    cluster = CombinatorialBounds.get_vertex_cluster(data)
+    sizes = np.array([len(vertices) for vertices in data["V_P"]])
+    distances = D[~np.eye(n, dtype=bool)].astype(np.float64)
+    feasible = CombinatorialBounds.feasible_arcs_matrix(cluster, P, d)
+    upper_bound = CombinatorialBounds.route_length(D, CombinatorialBounds.heuristic_route(D, cluster, P, d))
+    lower_bound = CombinatorialBounds.assignment_bound(D, cluster, P, d)
+    return {
+        "log_n": math.log(n),
+        "P": P,
+        "d": d,
+        "cluster_size_mean": float(sizes.mean()),
+        "cluster_size_cv": float(sizes.std() / sizes.mean()),
+        "cluster_size_max": int(sizes.max()),
+        "distance_cv": float(distances.std() / distances.mean()),
+        "feasible_arcs": float(feasible.sum() / (n * (n - 1))),
+        "bound_gap": (upper_bound - lower_bound) / upper_bound if upper_bound > 0 else 0.0
+    }
+
+def get_instance_file(instance_name):
+    """Instance file of an instance name (the instance data and the exported results name
+    the instances without the .json extension)."""
+    return instance_name if instance_name.endswith(".json") else instance_name + ".json"
+
+def result_score(result, solved=True):
+    """run_score of an exported run (or, with solved=False, of a run of the same time limit
+    without solution)."""
+    summary = {
+        "objective": result.get("objective_value") if solved else None,
+        "gap": result.get("GAP"),
+        "runtime": result["runtime"]
+    }
+    return run_score(summary, result.get("time_limit"))
+
+def result_solver_alias(result):
+    """The formulation that solved an exported run (the selected one, for AUTO runs)."""
+    if("auto_selection" in result):
+        return result["auto_selection"]["solver_alias"]
+    return result.get("solver_alias")
+
+class FormulationSelector(object):
+    """k nearest neighbours predictor of the fastest formulation of an instance, trained on
+    the results exported to the Results folder. The state (instance features, run scores and
+    the modification time of the result files already read) is kept in the Auto_Selection
+    folder, so each update only reads the new or rewritten result files."""
+
+    def __init__(self, candidates, path=SELECTOR_FILE):
+        self.candidates = list(candidates)
+        self.path = path
+        self.features = dict()
+        self.observations = []
+        self.processedFiles = dict()
+        if(os.path.isfile(self.path)):
+            with open(self.path, "r") as f:
+                state = json.load(f)
+            if(state.get("format_version") == SELECTOR_FORMAT_VERSION):
+                self.features = state["features"]
+                self.observations = state["observations"]
+                self.processedFiles = state["processed_files"]
+
+    def save(self):
+        PATHS.ensure_folders([PATHS.AUTO_SELECTION_FOLDER])
+        temporary_path = f"{self.path}.tmp{os.getpid()}"
+        with open(temporary_path, "w") as f:
+            json.dump({
+                "format_version": SELECTOR_FORMAT_VERSION,
+                "features": self.features,
+                "observations": self.observations,
+                "processed_files": self.processedFiles
+            }, f)
+        os.replace(temporary_path, self.path)
+
+    def getFeatures(self, instance_name, data=None):
+        instance_file = get_instance_file(instance_name)
+        if(instance_file not in self.features):
+            if(data is None):
+                data = read_instance(instance_file)
+            self.features[instance_file] = compute_features(data)
+        return self.features[instance_file]
+
+    def update(self):
+        """Reads the result files exported (or rewritten, e.g. by a rerun without datetime on
+        the file names) since the last update. Returns how many observations were added."""
+        if(not os.path.isdir(PATHS.RESULTS_FOLDER)):
+            return 0
+        added = 0
+        changed = False
+        for item in sorted(os.listdir(PATHS.RESULTS_FOLDER)):
+            path = os.path.join(PATHS.RESULTS_FOLDER, item)
+            if(not item.endswith(".json") or self.processedFiles.get(item) == os.path.getmtime(path)):
+                continue
+            if(item in self.processedFiles):
+                self.observations = [observation for observation in self.observations if observation["file"] != item]
+            self.processedFiles[item] = os.path.getmtime(path)
+            changed = True
+            with open(path, "r") as f:
+                result = json.load(f)
+            solver_alias = result_solver_alias(result)
+            if(result.get("runtime") is None or solver_alias not in self.candidates):
+                continue
+            instance_file = get_instance_file(result["instance_name"])
+            if(not os.path.isfile(os.path.join(PATHS.INSTANCES_FOLDER, instance_file))):
+                continue
+            self.getFeatures(instance_file)
+            self.observations.append({
+                "file": item,
+                "instance_name": instance_file,
+                "solver_alias": solver_alias,
+                "score": result_score(result),
+                "timeout_score": result_score(result, solved=False)
+            })
+            added += 1
+        if(changed):
+            self.save()
+        return added
+
+    def predict(self, features, k=NEIGHBOURS):
+        """Returns the candidate with the lowest weighted mean log score over the k instances
+        nearest to features (standardized euclidean distance, weights 1 / (1 + distance)), or
+        None without history. Every candidate is scored on the same k instances: on the ones
+        it was never run on, it counts as a run without solution (the worst timeout score
+        of the instance), so a formulation only run on easy instances cannot win elsewhere."""
+        if(len(self.observations) == 0):
+            return None
+        instances = sorted({observation["instance_name"] for observation in self.observations})
+        X = np.array([[self.features[instance][key] for key in FEATURES] for instance in instances])
+        mean, std = X.mean(axis=0), X.std(axis=0)
+        std[std == 0] = 1
+        x = (np.array([features[key] for key in FEATURES]) - mean) / std
+        distance = dict(zip(instances, np.linalg.norm((X - mean) / std - x, axis=1)))
+        nearest = sorted(instances, key=lambda instance: distance[instance])[:k]
+        weights = np.array([1 / (1 + distance[instance]) for instance in nearest])
+
+        scores = {instance: dict() for instance in nearest}
+        timeout_scores = dict()
+        for observation in self.observations:
+            instance = observation["instance_name"]
+            if(instance in scores):
+                scores[instance].setdefault(observation["solver_alias"], []).append(math.log1p(observation["score"]))
+                timeout_scores[instance] = max(timeout_scores.get(instance, 0), math.log1p(observation["timeout_score"]))
+
+        observed = {observation["solver_alias"] for observation in self.observations}
+        best_alias, best_score = None, None
+        for solver_alias in self.candidates:
+            if(solver_alias not in observed):
+                continue
+            instance_scores = [
+                np.mean(scores[instance][solver_alias]) if solver_alias in scores[instance] else timeout_scores[instance]
+                for instance in nearest
+            ]
+            score = float(np.dot(weights, instance_scores) / weights.sum())
+            if(best_score is None or score < best_score):
+                best_alias, best_score = solver_alias, score
+        return best_alias
+
+class AUTO_CTSP_d_Model(object):
+    """Selects the formulation predicted to be the fastest for the instance by the
+    FormulationSelector and returns an instance of that model class (with an
+    autoSelection attribute describing the choice), instead of an AUTO model.
+    ModelCache.build_model resolves the class by selectModelClass before building,
+    so the selected formulation is cached as if it was requested directly."""
+
+    alias = "AUTO"
+
+    @classmethod
+    def selectModelClass(cls, data):
+        """Returns the model class selected for data and the description of the choice."""
+        # Only the selected class is imported (the other formulations may need gurobipy).
+        selector = FormulationSelector([solver_alias for solver_alias in AVAILABLE_MODELS if solver_alias != cls.alias])
+        selector.update()
+        features = selector.getFeatures(data["instance_name"], data) if "instance_name" in data else compute_features(data)
+        solver_alias = selector.predict(features) or DEFAULT_SOLVER
+        return get_solver_class(solver_alias), {
+            "solver_alias": solver_alias,
+            "observations": len(selector.observations),
+            "features": features
+        }
+
+    def __new__(cls, data, relax=False, memLimit=None):
+        model_class, autoSelection = cls.selectModelClass(data)
+        solver = model_class(data, relax, memLimit)
+        solver.autoSelection = autoSelection
+        return solver
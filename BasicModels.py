@@ -1,11 +1,62 @@
+import gc
+
+from time import time as get_time
+
+import numpy as np
 import gurobipy as gp
 
+import CombinatorialBounds
+import ParameterTuning
+from MiscUtils import get_memory_usage_mb
+from SharedDistances import as_distance_matrix
+
+# Handles kept by releaseConstraintHandles (the route and the exported data only need these).
+LEAN_KEPT_HANDLES = ("x", "u", "y")
+
+# Handles and data used only while building the constraints, also released in lean mode
+# (t holds the n^3 linearization variables of SST1 and SST2).
+LEAN_BUILD_ONLY_ATTRIBUTES = ("t", "MTZ_M")
+
+CONSTRAINT_TYPES = (gp.Constr, gp.QConstr, gp.GenConstr)
+
 class CTSP_d_BaseModel(object):
     """Class to instantiate the common \"Base CTSP_d\" model, that is, a binary assignment model,
-    with functions to solve the model, print variables, and more."""
-    def __init__(self, data, relax=False, memLimit=None):
+    with functions to solve the model, print variables, and more. With names, the variables
+    are named (as ModelCache needs to rebind them when reading the model file)."""
+    def __init__(self, data, relax=False, memLimit=None, names=False):
+        self.initData(data, relax, memLimit)
+        self.names = names
+        self.model = gp.Model(env=self.env)
+
+        if(relax):
+            self.x = self.model.addVars(self.A, name = self.varName("x"))
+        else:
+            self.x = self.model.addVars(self.A, vtype = gp.GRB.BINARY, name = self.varName("x"))
+
+        # Objective Function
+        arcs = np.array(self.A)
+        self.model.setObjective(
+            gp.LinExpr(self.D[arcs[:, 0], arcs[:, 1]].tolist(), [self.x[a] for a in self.A]), 
+            sense = gp.GRB.MINIMIZE
+        )
+        del arcs
+
+        # All nodes must be visited exactly one time
+        self.c_1 = self.model.addConstrs(
+            gp.quicksum(self.x[i, j] for i in self.V if (i, j) in self.A) == 1
+            for j in self.V
+        )
+
+        # All nodes must be left exactly one time
+        self.c_2 = self.model.addConstrs(
+            gp.quicksum(self.x[i, j] for j in self.V if (i, j) in self.A) == 1
+            for i in self.V
+        )
+
+    def initData(self, data, relax=False, memLimit=None):
+        """Sets the instance data, the solution attributes and the Gurobi environment."""
         self.data = data
-        self.D = self.data["distances"]
+        self.D = as_distance_matrix(self.data["distances"])
         self.n = len(self.D)
         self.V = set(range(self.n))
         self.V_P = self.data["V_P"]
@@ -15,6 +66,15 @@ class CTSP_d_BaseModel(object):
 
         self.route = []
         self.routeList = []
+        self.bounds = None
+        self.callbacks = []
+
+        self.rootBound = None
+        self.reducedCosts = dict()
+        self.fixedArcs = set()
+        self.fixingUpperBound = None
+        self.rootFixedArcsCount = 0
+        self.incumbentFixedArcsCount = 0
 
         self.x = set()
         self.u = set()
@@ -28,31 +88,65 @@ class CTSP_d_BaseModel(object):
             self.env.setParam("MemLimit", self.memLimit)
 
         self.env.start()
-        self.model = gp.Model(env=self.env)            
         self.relax = relax
-
-        if(relax):
-            self.x = self.model.addVars(self.A)
-        else:
-            self.x = self.model.addVars(self.A, vtype = gp.GRB.BINARY)
-
-        # Objective Function
-        self.model.setObjective(
-            gp.quicksum(self.D[i][j] * self.x[i, j] for (i, j) in self.A), 
-            sense = gp.GRB.MINIMIZE
-        )
-
-        # All nodes must be visited exactly one time
-        self.c_1 = self.model.addConstrs(
-            gp.quicksum(self.x[i, j] for i in self.V if (i, j) in self.A) == 1
-            for j in self.V
-        )
-
-        # All nodes must be left exactly one time
-        self.c_2 = self.model.addConstrs(
-            gp.quicksum(self.x[i, j] for j in self.V if (i, j) in self.A) == 1
-            for i in self.V
-        )
+        self.loadedFromFile = None
+        self.profile = None
+        self.leanMemory = None
+
+    @classmethod
+    def fromFile(cls, data, path, relax=False, memLimit=None):
+        """Instantiates the model reading it from a model file (e.g. written by ModelCache),
+        instead of building it. The x, u, y (and t) variables are rebound by name, so the
+        constraint attributes are not available in the returned model."""
+        self = cls.__new__(cls)
+        self.initData(data, relax, memLimit)
+        self.names = True
+        self.model = gp.read(path, env=self.env)
+        self.loadedFromFile = path
+        self.rebindVars()
+        return self
+
+    def rebindVars(self):
+        """Rebuilds the x, u, y and t tupledicts from the variable names of the model."""
+        groups = {"x": dict(), "u": dict(), "y": dict(), "t": dict()}
+        for var in self.model.getVars():
+            name, _, index = var.VarName.partition("[")
+            if(name in groups):
+                key = tuple(int(k) for k in index[:-1].split(","))
+                groups[name][key if len(key) > 1 else key[0]] = var
+        self.x = gp.tupledict(groups["x"])
+        self.u = gp.tupledict(groups["u"]) if len(groups["u"]) > 0 else set()
+        self.y = gp.tupledict(groups["y"]) if len(groups["y"]) > 0 else set()
+        if(len(groups["t"]) > 0):
+            self.t = gp.tupledict(groups["t"])
+
+    def releaseConstraintHandles(self):
+        """Lean mode: after model.update(), drops the Python handles of the constraints (and the
+        build-only handles and data), keeping only the variables in LEAN_KEPT_HANDLES. Gurobi keeps the
+        constraints themselves. The memory before and after is stored in self.leanMemory."""
+        self.model.update()
+        before = get_memory_usage_mb()
+        released = []
+        for name, value in list(vars(self).items()):
+            if(name in LEAN_KEPT_HANDLES):
+                continue
+            if(isinstance(value, dict) and len(value) > 0):
+                value = next(iter(value.values()))
+            if(isinstance(value, CONSTRAINT_TYPES) or name in LEAN_BUILD_ONLY_ATTRIBUTES):
+                delattr(self, name)
+                released.append(name)
+        gc.collect()
+        self.leanMemory = {
+            "released_handles": released,
+            "memory_before_mb": before,
+            "memory_after_mb": get_memory_usage_mb()
+        }
+        return self.leanMemory
+
+    def varName(self, name):
+        """Name of a group of variables, or "" (unnamed) when the model is not written to a file:
+        the n^3 t variables alone would get millions of names on the larger instances."""
+        return name if self.names else ""
 
     def updateRoute(self):
         self.route = [(i, j) for (i, j) in self.A if self.x[i, j].X > 0.5]
@@ -69,11 +163,142 @@ class CTSP_d_BaseModel(object):
                     break
             self.v0 = self.v1
 
-    def solve(self, time=None, heur=None, log=0):
+    def computeBounds(self, heldKarpIterations=100, timeLimit=None, lnsWindow=None):
+        """Computes the combinatorial bounds of the instance (see CombinatorialBounds.compute_bounds).
+        With lnsWindow, the heuristic route is improved by the dynamic programming neighbourhood search."""
+        deadline = get_time() + timeLimit if timeLimit != None else None
+        self.bounds = CombinatorialBounds.compute_bounds(self.data, heldKarpIterations, timeLimit)
+        if(lnsWindow != None):
+            import DynamicProgramming
+
+            self.bounds["heuristic_route"], self.bounds["upper_bound"] = DynamicProgramming.improve_route(
+                self.D, CombinatorialBounds.get_vertex_cluster(self.data), self.V_P, self.d,
+                self.bounds["heuristic_route"], lnsWindow, deadline=deadline
+            )
+        return self.bounds
+
+    def applyBounds(self):
+        """Passes the combinatorial bounds to Gurobi: the heuristic route is given as a MIP start,
+        its length as Cutoff and as BestBdStop (stop when the dual bound reaches the upper bound)
+        and the lower bound as BestObjStop (stop when the incumbent reaches the lower bound)."""
+        if(self.bounds is None or self.relax):
+            return
+        self.routeToVars([
+            (self.bounds["heuristic_route"][k], self.bounds["heuristic_route"][k+1])
+            for k in range(self.n)
+        ])
+        # Distances are integers: half a unit keeps the heuristic route itself feasible.
+        self.model.setParam("Cutoff", self.bounds["upper_bound"] + 0.5)
+        self.model.setParam("BestObjStop", self.bounds["lower_bound"])
+        self.model.setParam("BestBdStop", self.bounds["upper_bound"])
+
+    def solveRootRelaxation(self, timeLimit=None):
+        """Solves the LP relaxation of this formulation (model.relax(), in the same environment
+        and so under the same memory limit) and stores its objective value and the reduced
+        costs of the x variables at their lower bound. The stop parameters of applyBounds,
+        copied by relax(), are reset so they cannot end the LP before its optimum."""
+        self.model.update()
+        relaxed = self.model.relax()
+        relaxed.setParam("Cutoff", gp.GRB.INFINITY)
+        relaxed.setParam("BestObjStop", -gp.GRB.INFINITY)
+        relaxed.setParam("BestBdStop", gp.GRB.INFINITY)
+        if(timeLimit != None):
+            relaxed.setParam("TimeLimit", max(0, timeLimit))
+        relaxed.optimize()
+        if(relaxed.Status == gp.GRB.OPTIMAL):
+            relaxedVars = relaxed.getVars()
+            self.rootBound = relaxed.ObjVal
+            self.reducedCosts = dict()
+            for (i, j) in self.A:
+                var = relaxedVars[self.x[i, j].index]
+                if(var.VBasis == gp.GRB.NONBASIC_LOWER):
+                    self.reducedCosts[i, j] = var.RC
+        relaxed.dispose()
+
+    def arcsToFix(self, upperBound):
+        """Returns the arcs not yet fixed whose reduced cost proves that no route
+        of length up to upperBound can use them."""
+        return [
+            (i, j) for ((i, j), rc) in self.reducedCosts.items()
+            if (i, j) not in self.fixedArcs if self.rootBound + rc > upperBound + 1e-6
+        ]
+
+    def reducedCostFixing(self, upperBound=None, timeLimit=None):
+        """Fixes x[i, j] to zero on the arcs whose root LP reduced cost exceeds the gap
+        between upperBound and the root LP bound. Returns the quantity of fixed arcs."""
+        if(self.relax):
+            return 0
+        if(self.rootBound is None):
+            self.solveRootRelaxation(timeLimit)
+        if(self.rootBound is None or upperBound is None):
+            return 0
+        self.fixingUpperBound = upperBound
+        arcs = self.arcsToFix(upperBound)
+        for (i, j) in arcs:
+            self.x[i, j].ub = 0
+        self.fixedArcs.update(arcs)
+        self.rootFixedArcsCount += len(arcs)
+        self.model.update()
+        return len(arcs)
+
+    def reducedCostFixingCallback(self, model, where):
+        """Repeats the reduced cost fixing (through lazy constraints) whenever a better incumbent appears."""
+        if(where != gp.GRB.Callback.MIPSOL or self.rootBound is None):
+            return
+        objective = model.cbGet(gp.GRB.Callback.MIPSOL_OBJ)
+        if(self.fixingUpperBound is not None and objective >= self.fixingUpperBound):
+            return
+        self.fixingUpperBound = objective
+        arcs = self.arcsToFix(objective)
+        for (i, j) in arcs:
+            model.cbLazy(self.x[i, j] == 0)
+        self.fixedArcs.update(arcs)
+        self.incumbentFixedArcsCount += len(arcs)
+
+    def runCallbacks(self, model, where):
+        for callback in self.callbacks:
+            callback(model, where)
+
+    def applyProfile(self):
+        """Sets the tuned Gurobi parameters of this formulation and instance size class
+        (see ParameterTuning), when a profile was saved for them."""
+        alias = getattr(self, "alias", None)
+        parameters = ParameterTuning.load_profile(alias, self.n) if alias != None else None
+        if(parameters is None):
+            return
+        for name, value in parameters.items():
+            self.model.setParam(name, value)
+        self.profile = ParameterTuning.get_profile_key(alias, self.n)
+
+    def solve(self, time=None, heur=None, log=0, useBounds=False, rcFixing=False, threads=None, lnsWindow=None, seed=None, useProfile=True, parameters=None):
+        start = get_time()
+        if(useProfile and not self.relax):
+            self.applyProfile()
+        if(useBounds):
+            if(self.bounds is None):
+                self.computeBounds(timeLimit=(time / 10 if time != None else None), lnsWindow=lnsWindow)
+            self.applyBounds()
+        if(rcFixing and not self.relax):
+            upperBound = self.bounds["upper_bound"] if self.bounds is not None else None
+            self.reducedCostFixing(upperBound, (time - (get_time() - start)) if time != None else None)
+            # Without an upper bound the root fixing fixes nothing, and the
+            # incumbents found by Gurobi are the only source of fixings.
+            if(self.rootBound is not None):
+                if(self.reducedCostFixingCallback not in self.callbacks):
+                    self.callbacks.append(self.reducedCostFixingCallback)
+                self.model.setParam("LazyConstraints", 1)
         if(time != None):
-            self.model.setParam("TimeLimit", time)
+            # The time spent on the bounds and the root relaxation counts in the time limit.
+            self.model.setParam("TimeLimit", max(0, time - (get_time() - start)))
         if(heur != None):
             self.model.setParam("Heuristics", heur)
+        if(threads != None):
+            self.model.setParam("Threads", threads)
+        if(seed != None):
+            self.model.setParam("Seed", seed)
+        if(parameters != None):
+            for name, value in parameters.items():
+                self.model.setParam(name, value)
         if(log >= 0):
             try:
                 self.model.Params.LogToConsole = log
@@ -82,7 +307,10 @@ class CTSP_d_BaseModel(object):
         else:
             self.model.Params.LogToConsole = 1
 
-        self.model.optimize()
+        if(len(self.callbacks) > 0):
+            self.model.optimize(self.runCallbacks)
+        else:
+            self.model.optimize()
 
         if(self.relax):
             return
@@ -95,6 +323,58 @@ class CTSP_d_BaseModel(object):
         self.updateRouteList()
         
 
+    def getModelSize(self):
+        return {"variables": self.model.NumVars, "constraints": self.model.NumConstrs}
+
+    def getRunSummary(self):
+        """Returns the status, objective value, gap and runtime of the last optimization."""
+        summary = {
+            "status": self.model.Status,
+            "objective": None,
+            "gap": None,
+            "runtime": self.model.Runtime
+        }
+        if(self.model.SolCount > 0):
+            summary["objective"] = self.model.ObjVal
+            if(not self.relax):
+                summary["gap"] = self.model.MIPGap
+        return summary
+
+    def getSolutionData(self):
+        """Returns the solution (and bounding) data exported to the results files."""
+        data = dict()
+        if(self.model.SolCount > 0):
+            data["objective_value"] = self.model.ObjVal
+            data["runtime"] = self.model.Runtime
+            data["GAP"] = self.model.MIPGap
+            data["route"] = self.routeList
+            data["x_vars"] = {str(pair): self.x[pair].X for pair in self.x if self.x[pair].X > 0.5}
+            if(len(self.u) > 0):
+                data["u_vars"] = {str(index): self.u[index].X for index in self.u if self.u[index].X > 0.5}
+            if(len(self.y) > 0):
+                data["y_vars"] = {str(pair): self.y[pair].X for pair in self.y if self.y[pair].X > 0.5}
+
+        if(self.bounds is not None):
+            data["bounds"] = {
+                key: value for (key, value) in self.bounds.items() if key != "heuristic_route"
+            }
+
+        if(self.profile is not None):
+            data["parameter_profile"] = self.profile
+
+        if(self.leanMemory is not None):
+            data["lean_memory"] = self.leanMemory
+
+        if(self.rootBound is not None):
+            data["reduced_cost_fixing"] = {
+                "root_bound": self.rootBound,
+                "arcs": len(self.A),
+                "fixed_arcs_root": self.rootFixedArcsCount,
+                "fixed_arcs_incumbents": self.incumbentFixedArcsCount,
+                "fixed_arcs": len(self.fixedArcs)
+            }
+        return data
+
     def printX(self, limX = 0.5):
         try:
             (self.x[self.A[0]].X <= 2) == True
@@ -151,14 +431,14 @@ class MTZ_CTSP_d_Model(CTSP_d_BaseModel):
     
     alias = "MTZ1"
     
-    def __init__(self, data, relax=False, memLimit=None):
-        CTSP_d_BaseModel.__init__(self, data, relax, memLimit)
+    def __init__(self, data, relax=False, memLimit=None, names=False):
+        CTSP_d_BaseModel.__init__(self, data, relax, memLimit, names)
 
         if(relax):
-            self.u = self.model.addVars(self.V, ub = self.n - 1)
+            self.u = self.model.addVars(self.V, ub = self.n - 1, name = self.varName("u"))
         else:
             #self.u = self.model.addVars(self.V, vtype = gp.GRB.INTEGER, ub = self.n - 1)
-            self.u = self.model.addVars(self.V, ub = self.n - 1)
+            self.u = self.model.addVars(self.V, ub = self.n - 1, name = self.varName("u"))
         
         self.c_MTZ = self.model.addConstrs(
            self.u[i] - self.u[j] + self.n * self.x[i, j] <= self.n - 1
@@ -175,17 +455,17 @@ class GP_CTSP_d_Model(CTSP_d_BaseModel):
     
     alias = "GP1"
     
-    def __init__(self, data, relax=False, memLimit=None):
-        CTSP_d_BaseModel.__init__(self, data, relax, memLimit)
+    def __init__(self, data, relax=False, memLimit=None, names=False):
+        CTSP_d_BaseModel.__init__(self, data, relax, memLimit, names)
 
         self.non_zero_i_j = [
             (i, j) for (i, j) in self.A if (i > 0 and j > 0)
         ]
 
         if(relax):
-            self.y = self.model.addVars(self.A)
+            self.y = self.model.addVars(self.A, name = self.varName("y"))
         else:
-            self.y = self.model.addVars(self.A, vtype = gp.GRB.BINARY)
+            self.y = self.model.addVars(self.A, vtype = gp.GRB.BINARY, name = self.varName("y"))
         
         self.c_prec_1 = self.model.addConstrs(
             self.x[i, j] - self.y[i, j] <= 0 for (i, j) in self.non_zero_i_j
@@ -226,13 +506,13 @@ class SSB_CTSP_d_Model(CTSP_d_BaseModel):
     
     alias = "SSB1"
     
-    def __init__(self, data, relax=False, memLimit=None):
-        CTSP_d_BaseModel.__init__(self, data, relax, memLimit)
+    def __init__(self, data, relax=False, memLimit=None, names=False):
+        CTSP_d_BaseModel.__init__(self, data, relax, memLimit, names)
 
         if(relax):
-            self.y = self.model.addVars(self.A)
+            self.y = self.model.addVars(self.A, name = self.varName("y"))
         else:
-            self.y = self.model.addVars(self.A, vtype = gp.GRB.BINARY)
+            self.y = self.model.addVars(self.A, vtype = gp.GRB.BINARY, name = self.varName("y"))
         
         self.non_zero_i_j = [
             (i, j) for (i, j) in self.A if (i > 0 and j > 0)
@@ -276,8 +556,8 @@ class SST_CTSP_d_Model(CTSP_d_BaseModel):
     
     alias = "SST1"
     
-    def __init__(self, data, relax=False, memLimit=None):
-        CTSP_d_BaseModel.__init__(self, data, relax, memLimit)
+    def __init__(self, data, relax=False, memLimit=None, names=False):
+        CTSP_d_BaseModel.__init__(self, data, relax, memLimit, names)
 
         self.non_zero_i_j_k = [
             (i, j, k) for i in self.V for j in self.V for k in self.V 
@@ -286,11 +566,11 @@ class SST_CTSP_d_Model(CTSP_d_BaseModel):
         ]
 
         if(relax):
-            self.y = self.model.addVars(self.A)
-            self.t = self.model.addVars(self.non_zero_i_j_k)
+            self.y = self.model.addVars(self.A, name = self.varName("y"))
+            self.t = self.model.addVars(self.non_zero_i_j_k, name = self.varName("t"))
         else:
-            self.y = self.model.addVars(self.A, vtype = gp.GRB.BINARY)
-            self.t = self.model.addVars(self.non_zero_i_j_k, vtype = gp.GRB.BINARY)
+            self.y = self.model.addVars(self.A, vtype = gp.GRB.BINARY, name = self.varName("y"))
+            self.t = self.model.addVars(self.non_zero_i_j_k, vtype = gp.GRB.BINARY, name = self.varName("t"))
         
         self.SST_51 = self.model.addConstrs(
            self.y[i, j] + self.x[j, i] + self.y[j, k] + self.y[k, i] <= 2
@@ -0,0 +1,182 @@
+import os
+import time
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import PATHS
+import ModelCache
+
+from InstancesUtils import read_instance
+from MiscUtils import (
+    get_solver_class, export_results, get_events_log_path, create_incumbent_callback, get_run_summary,
+    get_solved_instances_list_path, create_solved_instances_list, load_solved_instances_list,
+    append_to_solved_instances_list
+)
+from EventLog import EventLog, RemoteEventLog, start_metrics_server
+from SharedDistances import SharedDistancesPool, attach_distances
+
+# Event log of a worker process, set by init_worker.
+WORKER_EVENT_LOG = None
+
+def get_solved_instances(config, solver_alias):
+    if(not config["use_solved_instances_list"]):
+        return set()
+    if(not os.path.isfile(get_solved_instances_list_path(solver_alias))):
+        return set()
+    return load_solved_instances_list(solver_alias)
+
+def plan_jobs(config):
+    """Returns the (solver_alias, instance, already_solved) triples of a batch, without solving anything."""
+    jobs = []
+    for solver_alias in config["solvers"]:
+        solved_instances_list = get_solved_instances(config, solver_alias)
+        for instance in config["instances"]:
+            jobs.append((solver_alias, instance, instance in solved_instances_list))
+    return jobs
+
+def solve_instance(config, solver_alias, instance, event_log, data=None, threads=None):
+    """Builds and solves one (solver_alias, instance) job, exporting its results."""
+    if(data is None):
+        data = read_instance(instance)
+    build_start = time.time()
+    solver = ModelCache.build_model(
+        get_solver_class(solver_alias), data,
+        use_cache=config["model_cache"], size_limit_mb=config["model_cache_size_mb"],
+        lean=config["lean"]
+    )
+    event_log.model_built(
+        solver_alias, instance, time.time() - build_start,
+        from_cache=getattr(solver, "loadedFromFile", None) is not None, **solver.getModelSize()
+    )
+    if(getattr(solver, "leanMemory", None) is not None):
+        lean_memory = solver.leanMemory
+        if(lean_memory["memory_before_mb"] is not None):
+            msg = f"{solver_alias}: released {len(lean_memory['released_handles'])} constraint handles, memory {lean_memory['memory_before_mb']:.1f} MB -> {lean_memory['memory_after_mb']:.1f} MB"
+        else:
+            msg = f"{solver_alias}: released {len(lean_memory['released_handles'])} constraint handles"
+        event_log.emit("lean_model", 4, msg, solver_alias=solver_alias, instance_name=instance, **lean_memory)
+    if(hasattr(solver, "autoSelection")):
+        event_log.emit(
+            "solver_selected", 3, f"{solver_alias}: selected {solver.alias}",
+            solver_alias=solver_alias, instance_name=instance, selected_solver_alias=solver.alias,
+            observations=solver.autoSelection["observations"], features=solver.autoSelection["features"]
+        )
+    solver.callbacks.append(create_incumbent_callback(event_log, solver))
+    solver.solve(
+        time=config["time_limit"],
+        log=config["print_log"],
+        useBounds=config["use_bounds"],
+        rcFixing=config["rc_fixing"],
+        threads=threads,
+        lnsWindow=config["dp_lns_window"],
+        useProfile=config["use_profiles"]
+    )
+    event_log.run_finished(solver_alias, instance, **get_run_summary(solver))
+    if(config["export_solution"]):
+        export_results(solver, config["datetime_on_filename"], config["time_limit"])
+    return solver
+
+def solve_job(config, solver_alias, instance, event_log, data=None, threads=None):
+    """solve_instance registering a run_failed event (and re-raising) when the job raises."""
+    try:
+        return solve_instance(config, solver_alias, instance, event_log, data, threads)
+    except Exception as error:
+        event_log.run_failed(
+            solver_alias, instance, repr(error),
+            msg=f"{solver_alias}: failed to solve {instance}: {error!r}"
+        )
+        raise
+
+def init_worker(events_queue):
+    global WORKER_EVENT_LOG
+    WORKER_EVENT_LOG = RemoteEventLog(events_queue)
+
+def solve_instance_in_worker(config, solver_alias, instance, data, distances_descriptor, threads, msg):
+    """Worker side of solve_instance: the distances are attached from shared memory."""
+    WORKER_EVENT_LOG.run_started(solver_alias, instance, msg=msg)
+    attach_distances(data, distances_descriptor)
+    solve_job(config, solver_alias, instance, WORKER_EVENT_LOG, data, threads)
+    return solver_alias, instance
+
+def run_jobs_in_parallel(config, jobs, event_log):
+    """Solves the (solver_alias, instance, msg) jobs in config["workers"] processes. Each base
+    graph distance matrix is placed once in shared memory and attached by the workers."""
+    workers = config["workers"]
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    events_queue = multiprocessing.Queue()
+    forward_thread = event_log.forward_from(events_queue)
+    distances_pool = SharedDistancesPool()
+    try:
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(events_queue,)) as executor:
+            futures = []
+            for solver_alias, instance, msg in jobs:
+                data = read_instance(instance)
+                descriptor = distances_pool.get_descriptor(data)
+                del data["distances"]
+                futures.append(executor.submit(
+                    solve_instance_in_worker, config, solver_alias, instance, data, descriptor, threads, msg
+                ))
+            for future in as_completed(futures):
+                solver_alias, instance = future.result()
+                if(config["use_solved_instances_list"]):
+                    append_to_solved_instances_list(solver_alias, instance)
+                    event_log.emit("stored_solved_instance", 4, f"Stored {instance} to {solver_alias} solved instances list!", solver_alias=solver_alias, instance_name=instance)
+    finally:
+        events_queue.put(None)
+        forward_thread.join()
+        distances_pool.close()
+
+def run_batch(config):
+    """Solves every (solver, instance) pair of config, skipping the already solved ones."""
+    PATHS.ensure_folders()
+    event_log = EventLog(
+        get_events_log_path() if config["export_events"] else None,
+        console_level=config["log_level"]
+    )
+    event_log.metrics.set_gauge("jobs_total", len(config["solvers"]) * len(config["instances"]))
+    metrics_server = None
+    if(config["metrics_port"] is not None):
+        metrics_server = start_metrics_server(event_log.metrics, config["metrics_port"])
+
+    try:
+        event_log.emit(
+            "batch_started", 1, "Starting Solution Process!",
+            solvers=config["solvers"], instances=config["instances"]
+        )
+
+        solvers_list = config["solvers"]
+        instances_list = config["instances"]
+        parallel_jobs = []
+        solver_count = 1
+        for solver_alias in solvers_list:
+            event_log.emit("solver_started", 2, f"Actual Solver: {solver_alias} ({solver_count}/{len(solvers_list)})", solver_alias=solver_alias)
+            if(config["use_solved_instances_list"]):
+                create_solved_instances_list(solver_alias)
+            solved_instances_list = get_solved_instances(config, solver_alias)
+            instances_count = 1
+            for instance in instances_list:
+                if instance in solved_instances_list:
+                    event_log.skipped(solver_alias, instance, "solved", msg=f"Skipped solved instance {instance}!")
+                    instances_count += 1
+                    continue
+                msg = f"Solving instance {instance} ({instances_count}/{len(instances_list)})..."
+                instances_count += 1
+                if(config["workers"] > 1):
+                    parallel_jobs.append((solver_alias, instance, f"{solver_alias}: {msg}"))
+                    continue
+                event_log.run_started(solver_alias, instance, msg=msg)
+                solve_job(config, solver_alias, instance, event_log)
+                if(config["use_solved_instances_list"]):
+                    append_to_solved_instances_list(solver_alias, instance)
+                    event_log.emit("stored_solved_instance", 4, f"Stored {instance} to {solver_alias} solved instances list!", solver_alias=solver_alias, instance_name=instance)
+            solver_count += 1
+
+        if(len(parallel_jobs) > 0):
+            run_jobs_in_parallel(config, parallel_jobs, event_log)
+
+        event_log.emit("batch_finished", 1, "Finished Solution Process!", **event_log.metrics.snapshot())
+    finally:
+        event_log.close()
+        if(metrics_server is not None):
+            metrics_server.shutdown()
@@ -0,0 +1,244 @@
+import math
+import time
+
+import numpy as np
+
+from SharedDistances import as_distance_matrix
+
+def get_vertex_cluster(data):
+    """Returns an array mapping every vertex to its cluster index (the depot, vertex 0, maps to -1)."""
+    cluster = np.full(len(data["distances"]), -1, dtype=np.int64)
+    for p, vertices in enumerate(data["V_P"]):
+        cluster[vertices] = p
+    return cluster
+
+def feasible_arcs_matrix(cluster, P, d):
+    """Boolean matrix of the arcs (i, j) that can be part of a route respecting the d-relaxed priority rule."""
+    p = cluster[:, None]
+    q = cluster[None, :]
+    # Every vertex of cluster q must be visited before the ones of cluster p when p > q + d,
+    # and a forward jump skipping a whole cluster r with p + d < r < q - d is impossible.
+    feasible = (p <= q + d) & (q <= p + 2 * d + 1)
+    feasible[0, :] = cluster <= d
+    feasible[:, 0] = cluster >= P - 1 - d
+    np.fill_diagonal(feasible, False)
+    return feasible
+
+def route_length(D, route):
+    route = np.asarray(route)
+    return int(D[route[:-1], route[1:]].sum(dtype=np.int64))
+
+def assignment_bound(D, cluster, P, d):
+    """Lower bound given by the assignment relaxation encoded in CTSP_d_BaseModel, restricted
+    to the arcs allowed by the d-relaxed priority rule and solved by the Hungarian algorithm."""
+    n = len(D)
+    feasible = feasible_arcs_matrix(cluster, P, d)
+    BIG = 1 + n * int(D[feasible].max())
+    cost = np.where(feasible, D, BIG).astype(np.int64)
+    # Shortest augmenting path version of the Hungarian algorithm, O(n^3),
+    # with the scan over the columns vectorized. Index 0 is a dummy row/column.
+    u = np.zeros(n + 1, dtype=np.int64)
+    v = np.zeros(n + 1, dtype=np.int64)
+    match = np.zeros(n + 1, dtype=np.int64)
+    way = np.zeros(n + 1, dtype=np.int64)
+    INF = np.iinfo(np.int64).max // 4
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        min_v = np.full(n + 1, INF, dtype=np.int64)
+        used = np.zeros(n + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            free = ~used
+            free[0] = False
+            current = np.full(n + 1, INF, dtype=np.int64)
+            current[1:] = cost[i0 - 1] - u[i0] - v[1:]
+            improve = free & (current < min_v)
+            min_v[improve] = current[improve]
+            way[improve] = j0
+            candidates = np.where(free, min_v, INF)
+            j1 = int(np.argmin(candidates))
+            delta = candidates[j1]
+            u[match[used]] += delta
+            v[used] -= delta
+            min_v[~used] -= delta
+            j0 = j1
+            if(match[j0] == 0):
+                break
+        while True:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+            if(j0 == 0):
+                break
+    return int(cost[match[1:] - 1, np.arange(n)].sum())
+
+def _one_tree(D, feasible, pi):
+    """Computes a minimum cluster-aware 1-tree under the node penalties pi.
+    The spanning tree covers the vertices 1..n-1 and the depot is connected by its cheapest
+    feasible leaving arc and its cheapest feasible entering arc (to different vertices).
+    Returns the penalized 1-tree cost and the degree of each vertex."""
+    n = len(D)
+    degree = np.zeros(n, dtype=np.int64)
+
+    # Prim's algorithm over the symmetric costs min(D[i][j], D[j][i]) of the feasible arcs.
+    cost = np.where(feasible, D, np.inf)
+    cost = np.minimum(cost, cost.T) + pi[:, None] + pi[None, :]
+    in_tree = np.zeros(n, dtype=bool)
+    in_tree[0] = True
+    best = np.full(n, np.inf)
+    parent = np.full(n, -1, dtype=np.int64)
+    best[1] = 0
+    total = 0.0
+    for _ in range(n - 1):
+        k = int(np.argmin(np.where(in_tree, np.inf, best)))
+        if(in_tree[k] or best[k] == np.inf):
+            return None, None
+        in_tree[k] = True
+        total += best[k]
+        if(parent[k] != -1):
+            degree[k] += 1
+            degree[parent[k]] += 1
+        improve = ~in_tree & (cost[k] < best)
+        best[improve] = cost[k][improve]
+        parent[improve] = k
+
+    leaving = np.where(feasible[0], D[0] + pi[0] + pi, np.inf)
+    entering = np.where(feasible[:, 0], D[:, 0] + pi[0] + pi, np.inf)
+    best_pair = None
+    for j in np.argsort(leaving)[:2]:
+        for i in np.argsort(entering)[:2]:
+            if((i != j or n == 2) and leaving[j] + entering[i] < np.inf):
+                if(best_pair is None or leaving[j] + entering[i] < best_pair[0]):
+                    best_pair = (leaving[j] + entering[i], j, i)
+    if(best_pair is None):
+        return None, None
+    total += best_pair[0]
+    degree[0] = 2
+    degree[best_pair[1]] += 1
+    degree[best_pair[2]] += 1
+    return total, degree
+
+def one_tree_bound(D, cluster, P, d):
+    """Lower bound given by a single cluster-aware 1-tree (without node penalties)."""
+    value, _ = _one_tree(D, feasible_arcs_matrix(cluster, P, d), np.zeros(len(D)))
+    return value
+
+def held_karp_bound(D, cluster, P, d, upper_bound=None, max_iter=100, time_limit=None):
+    """Held-Karp lower bound: subgradient optimization of the node penalties of the cluster-aware 1-tree."""
+    best, _ = held_karp_penalties(D, feasible_arcs_matrix(cluster, P, d), upper_bound, max_iter, time_limit)
+    return best
+
+def held_karp_penalties(D, feasible, upper_bound=None, max_iter=100, time_limit=None):
+    """Subgradient optimization of the 1-tree node penalties over the feasible arcs.
+    Returns the best bound and the penalties giving it."""
+    pi = np.zeros(len(D))
+    best_pi = pi
+    best = -math.inf
+    step_factor = 2.0
+    no_improvement = 0
+    start = time.time()
+    for _ in range(max_iter):
+        value, degree = _one_tree(D, feasible, pi)
+        if(value is None):
+            break
+        value -= 2 * pi.sum()
+        if(value > best + 1e-9):
+            best = value
+            best_pi = pi
+            no_improvement = 0
+        else:
+            no_improvement += 1
+            if(no_improvement >= 10):
+                step_factor /= 2
+                no_improvement = 0
+        subgradient = degree - 2
+        norm = int((subgradient * subgradient).sum())
+        if(norm == 0):
+            break
+        if(upper_bound is None or upper_bound <= value):
+            target = 1.05 * abs(value) + 1
+        else:
+            target = upper_bound
+        pi = pi + step_factor * (target - value) / norm * subgradient
+        if(step_factor < 1e-4):
+            break
+        if(time_limit is not None and time.time() - start > time_limit):
+            break
+    return float(best), best_pi
+
+def nearest_neighbor_route(D, cluster, P, d):
+    """Builds a feasible route visiting at each step the closest vertex allowed by the d-relaxed priority rule."""
+    n = len(D)
+    remaining = np.bincount(cluster[1:], minlength=P)
+    available = np.ones(n, dtype=bool)
+    available[0] = False
+    route = [0]
+    first_open = 0
+    for _ in range(n - 1):
+        while(first_open < P and remaining[first_open] == 0):
+            first_open += 1
+        allowed = available & (cluster <= first_open + d)
+        k = int(np.argmin(np.where(allowed, D[route[-1]], np.inf)))
+        available[k] = False
+        remaining[cluster[k]] -= 1
+        route.append(k)
+    route.append(0)
+    return route
+
+def two_opt(D, route, cluster, d):
+    """Improves a route with 2-opt moves. Only segments spanning at most d + 1 consecutive clusters
+    are reversed, which keeps the d-relaxed priority rule satisfied. Assumes symmetric distances."""
+    route = np.array(route)
+    n = len(route) - 1
+    improved = True
+    while(improved):
+        improved = False
+        for a in range(n - 1):
+            # Reversible segments route[a+1..b] have cluster span at most d.
+            segment_clusters = cluster[route[a+1:n]]
+            span = np.maximum.accumulate(segment_clusters) - np.minimum.accumulate(segment_clusters)
+            b = a + 1 + np.arange(int(np.argmax(span > d)) if np.any(span > d) else n - a - 1)
+            if(len(b) == 0):
+                continue
+            delta = (D[route[a], route[b]] + D[route[a+1], route[b+1]]
+                     - D[route[a], route[a+1]] - D[route[b], route[b+1]])
+            k = int(np.argmin(delta))
+            if(delta[k] < 0):
+                route[a+1:b[k]+1] = route[a+1:b[k]+1][::-1]
+                improved = True
+    return route.tolist()
+
+def heuristic_route(D, cluster, P, d):
+    route = nearest_neighbor_route(D, cluster, P, d)
+    if(np.array_equal(D, D.T)):
+        route = two_opt(D, route, cluster, d)
+    return route
+
+def compute_bounds(data, held_karp_iterations=100, time_limit=None):
+    """Computes the cheap combinatorial bounds of an instance, returning a dict with the
+    lower bounds, the best of them, a heuristic route and its length, and the time spent."""
+    start = time.time()
+    D = as_distance_matrix(data["distances"])
+    P = len(data["V_P"])
+    d = data["d"]
+    cluster = get_vertex_cluster(data)
+
+    bounds = dict()
+    bounds["heuristic_route"] = heuristic_route(D, cluster, P, d)
+    bounds["upper_bound"] = route_length(D, bounds["heuristic_route"])
+    bounds["assignment_bound"] = assignment_bound(D, cluster, P, d)
+    bounds["one_tree_bound"] = float(one_tree_bound(D, cluster, P, d))
+    bounds["held_karp_bound"] = held_karp_bound(
+        D, cluster, P, d, bounds["upper_bound"], held_karp_iterations, time_limit
+    )
+
+    # Distances are integers, so any fractional bound can be rounded up.
+    bounds["lower_bound"] = max(
+        bounds["assignment_bound"],
+        math.ceil(bounds["one_tree_bound"] - 1e-6),
+        math.ceil(bounds["held_karp_bound"] - 1e-6)
+    )
+    bounds["runtime"] = time.time() - start
+    return bounds
@@ -0,0 +1,304 @@
+import os
+import math
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import CombinatorialBounds
+from DynamicProgramming import DP_CTSP_d_Model, INF, MAX_ARRAY_CLUSTER_SIZE, get_time, held_karp_table, held_karp_path
+
+HELD_KARP_PENALTY_ITERATIONS = 200
+
+def held_karp_paths(Dc, entry):
+    """Shortest Hamiltonian paths of the cluster with distances Dc starting at entry, by the
+    Held-Karp table of DynamicProgramming. Returns the path lengths to every exit (inf when not
+    reachable, i.e. the entry itself for clusters with more than one vertex) and the paths."""
+    k = len(Dc)
+    if(k == 1):
+        return np.zeros((1,)), [[0]]
+    start_costs = np.full(k, INF, dtype=np.int64)
+    start_costs[entry] = 0
+    table, parent = held_karp_table(Dc, start_costs)
+    lengths = np.where(table[-1] >= INF, np.inf, table[-1]).astype(np.float64)
+    lengths[entry] = np.inf
+    paths = [held_karp_path(parent, exit_vertex) if exit_vertex != entry else None for exit_vertex in range(k)]
+    return lengths, paths
+
+def solve_path_mip(Dc, entry, exit_vertex, cutoff=None, time_limit=None):
+    """Shortest Hamiltonian path from entry to exit_vertex of the cluster with distances Dc, by a
+    one thread Gurobi MIP (assignment constraints plus lazy subtour elimination cuts).
+    Paths not shorter than cutoff are discarded. Returns (status, length or bound, path), the
+    status being "OPTIMAL", "CUTOFF" (the bound is cutoff) or "TIME_LIMIT" (the bound is the MIP
+    bound, or None when the MIP stopped before having one)."""
+    import gurobipy as gp
+
+    k = len(Dc)
+    env = gp.Env(empty=True)
+    env.setParam("OutputFlag", 0)
+    env.start()
+    model = gp.Model(env=env)
+    arcs = [(i, j) for i in range(k) for j in range(k) if i != j and i != exit_vertex and j != entry]
+    x = model.addVars(arcs, vtype=gp.GRB.BINARY, obj=[float(Dc[i, j]) for (i, j) in arcs], name="x")
+    model.addConstrs(x.sum(i, "*") == 1 for i in range(k) if i != exit_vertex)
+    model.addConstrs(x.sum("*", j) == 1 for j in range(k) if j != entry)
+    model.addConstrs(x[i, j] + x[j, i] <= 1 for (i, j) in arcs if i < j and (j, i) in x)
+    model.setParam("LazyConstraints", 1)
+    model.setParam("Threads", 1)
+    if(cutoff != None):
+        model.setParam("Cutoff", cutoff - 0.5)
+    if(time_limit != None):
+        model.setParam("TimeLimit", max(time_limit, 0))
+
+    def successors(values):
+        return {i: j for (i, j), value in values.items() if value > 0.5}
+
+    def subtour_callback(gurobi_model, where):
+        if(where != gp.GRB.Callback.MIPSOL):
+            return
+        successor = successors(gurobi_model.cbGetSolution(x))
+        unvisited = set(range(k))
+        v = entry
+        while(v is not None):
+            unvisited.discard(v)
+            v = successor.get(v)
+        while(len(unvisited) > 0):
+            cycle = [unvisited.pop()]
+            while(successor[cycle[-1]] != cycle[0]):
+                cycle.append(successor[cycle[-1]])
+                unvisited.discard(cycle[-1])
+            gurobi_model.cbLazy(gp.quicksum(x[i, j] for i in cycle for j in cycle if (i, j) in x) <= len(cycle) - 1)
+
+    model.optimize(subtour_callback)
+    if(model.Status == gp.GRB.OPTIMAL and model.SolCount > 0):
+        successor = successors(model.getAttr("X", x))
+        path = [entry]
+        while(path[-1] != exit_vertex):
+            path.append(successor[path[-1]])
+        status, value = "OPTIMAL", round(model.ObjVal)
+    elif(model.Status in (gp.GRB.CUTOFF, gp.GRB.INFEASIBLE)):
+        status, value, path = "CUTOFF", cutoff, None
+    else:
+        status, value, path = "TIME_LIMIT", None, None
+        if(model.Status == gp.GRB.TIME_LIMIT):
+            try:
+                value = math.ceil(model.ObjBound - 1e-6)
+            except gp.GurobiError:
+                pass
+    model.dispose()
+    env.dispose()
+    return status, value, path
+
+def spanning_tree_cost(cost):
+    """Prim's algorithm over a symmetric cost matrix. Returns the minimum spanning tree cost."""
+    k = len(cost)
+    in_tree = np.zeros(k, dtype=bool)
+    best = np.full(k, np.inf)
+    best[0] = 0
+    total = 0.0
+    for _ in range(k):
+        v = int(np.argmin(np.where(in_tree, np.inf, best)))
+        in_tree[v] = True
+        total += best[v]
+        best = np.minimum(best, cost[v])
+    return total
+
+def path_lower_bounds(Dc):
+    """Lower bounds on the shortest Hamiltonian path of every entry/exit pair of a cluster.
+    With the Held-Karp penalties pi of the cluster cycle, a path (a spanning tree where only
+    a and b have degree 1) costs at least MST_pi - 2 sum(pi) + pi[a] + pi[b]. A path closed
+    by the arc b -> a is a cycle, so it also costs at least the Held-Karp bound minus D[b, a]."""
+    k = len(Dc)
+    feasible = ~np.eye(k, dtype=bool)
+    cycle_bound, pi = CombinatorialBounds.held_karp_penalties(Dc, feasible, max_iter=HELD_KARP_PENALTY_ITERATIONS)
+    symmetric = np.minimum(Dc, Dc.T).astype(np.float64)
+    tree_bound = spanning_tree_cost(np.where(feasible, symmetric + pi[:, None] + pi[None, :], np.inf)) - 2 * pi.sum()
+    bounds = np.maximum(tree_bound + pi[:, None] + pi[None, :], cycle_bound - Dc.T)
+    bounds = np.ceil(bounds - 1e-6)
+    bounds[~feasible] = np.inf
+    return bounds
+
+def chain_dp(D, V_P, costs):
+    """Shortest path over the chain of clusters, given the path length costs[p][a, b] of every
+    entry/exit pair of each cluster. Returns the best route length, its (entry, exit) pairs and,
+    for each cluster, the length of the best route through each of its pairs."""
+    P = len(V_P)
+    clusters = [np.array(vertices) for vertices in V_P]
+    arrive = D[0, clusters[0]].astype(np.float64)
+    forward_in, entry_from, exit_entry = [], [], []
+    for p in range(P):
+        forward_in.append(arrive)
+        through = arrive[:, None] + costs[p]
+        exit_entry.append(through.argmin(axis=0))
+        leave = through.min(axis=0)
+        if(p < P - 1):
+            step = leave[:, None] + D[np.ix_(clusters[p], clusters[p + 1])]
+            entry_from.append(step.argmin(axis=0))
+            arrive = step.min(axis=0)
+    total = leave + D[clusters[-1], 0]
+    best_exit = int(total.argmin())
+    length = float(total[best_exit])
+
+    backward_out = [None] * P
+    depart = D[clusters[-1], 0].astype(np.float64)
+    for p in range(P - 1, -1, -1):
+        backward_out[p] = depart
+        if(p > 0):
+            inside = (costs[p] + depart[None, :]).min(axis=1)
+            depart = (D[np.ix_(clusters[p - 1], clusters[p])] + inside[None, :]).min(axis=1)
+    values = [forward_in[p][:, None] + costs[p] + backward_out[p][None, :] for p in range(P)]
+
+    pairs = [None] * P
+    b = best_exit
+    for p in range(P - 1, -1, -1):
+        a = int(exit_entry[p][b])
+        pairs[p] = (a, b)
+        if(p > 0):
+            b = int(entry_from[p - 1][a])
+    return length, pairs, values
+
+def solve_subproblem(task):
+    """Worker side of the decomposition: a Held-Karp entry table or a path MIP."""
+    if(task[0] == "held_karp"):
+        _, p, Dc, entry = task
+        return ("held_karp", p, entry) + held_karp_paths(Dc, entry)
+    _, p, Dc, entry, exit_vertex, cutoff, time_limit = task
+    return ("mip", p, entry, exit_vertex) + solve_path_mip(Dc, entry, exit_vertex, cutoff, time_limit)
+
+class Decomposition_CTSP_d_Model(DP_CTSP_d_Model):
+    """Class to solve the CTSP_d with d = 0 by decomposition: the route is a chain of
+    Hamiltonian paths inside the clusters, in order, linked by the arcs between consecutive
+    clusters. The entry/exit path subproblems are solved in parallel (Held-Karp for small
+    clusters, path MIPs for large ones) and combined by a shortest path DP over the chain.
+    Large clusters are explored best first: a pair is only solved when the chain through it,
+    with lower bounds for the unsolved pairs, can still beat the best route, so the route
+    is certified optimal when no such pair is left. Instances with d > 0, or whose clusters
+    all fit the Held-Karp table of DP, are solved as by DP."""
+
+    alias = "DEC"
+
+    def __init__(self, data, relax=False, memLimit=None):
+        DP_CTSP_d_Model.__init__(self, data, relax, memLimit)
+        self.workers = None
+        self.subproblemsSolved = 0
+        self.rounds = 0
+
+    def getClusterMatrices(self):
+        return [np.ascontiguousarray(self.D[np.ix_(vertices, vertices)]) for vertices in self.V_P]
+
+    def solve(self, time=None, heur=None, log=0, useBounds=False, rcFixing=False, threads=None, lnsWindow=None, seed=None, useProfile=True, parameters=None):
+        if(self.d != 0 or max(len(vertices) for vertices in self.V_P) <= MAX_ARRAY_CLUSTER_SIZE):
+            return DP_CTSP_d_Model.solve(self, time, heur, log, useBounds, rcFixing, threads, lnsWindow, seed)
+
+        start = get_time()
+        deadline = start + time if time != None else None
+        self.workers = threads if threads != None else (os.cpu_count() or 1)
+        matrices = self.getClusterMatrices()
+
+        # costs[p][a, b]: exact length (solved[p][a, b]) or lower bound of the a -> b path of cluster p.
+        costs, solved, closed, paths = [], [], [], []
+        for Dc in matrices:
+            k = len(Dc)
+            if(k <= MAX_ARRAY_CLUSTER_SIZE):
+                costs.append(np.full((k, k), np.inf))
+            else:
+                costs.append(path_lower_bounds(Dc))
+            solved.append(np.zeros((k, k), dtype=bool))
+            closed.append(np.zeros((k, k), dtype=bool))
+            paths.append(dict())
+
+        def store(result):
+            self.subproblemsSolved += 1
+            if(result[0] == "held_karp"):
+                _, p, entry, lengths, entry_paths = result
+                costs[p][entry] = lengths
+                solved[p][entry] = closed[p][entry] = np.isfinite(lengths)
+                for exit_vertex, path in enumerate(entry_paths):
+                    if(path is not None):
+                        paths[p][entry, exit_vertex] = path
+                return
+            _, p, entry, exit_vertex, status, value, path = result
+            closed[p][entry, exit_vertex] = True
+            if(value is not None):
+                costs[p][entry, exit_vertex] = max(costs[p][entry, exit_vertex], value)
+            if(status == "OPTIMAL"):
+                solved[p][entry, exit_vertex] = True
+                paths[p][entry, exit_vertex] = path
+
+        executor = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        run = executor.map if executor is not None else map
+        try:
+            for result in run(solve_subproblem, [
+                ("held_karp", p, Dc, entry)
+                for p, Dc in enumerate(matrices) if len(Dc) <= MAX_ARRAY_CLUSTER_SIZE
+                for entry in range(len(Dc))
+            ]):
+                store(result)
+
+            while(True):
+                self.rounds += 1
+                lowerBound, _, values = chain_dp(self.D, self.V_P, costs)
+                length, pairs, _ = chain_dp(self.D, self.V_P, [np.where(s, c, np.inf) for c, s in zip(costs, solved)])
+                if(math.ceil(lowerBound - 1e-6) >= length):
+                    break
+                if(deadline is not None and get_time() >= deadline):
+                    break
+                candidates = [
+                    (values[p][a, b], p, a, b)
+                    for p in range(self.P)
+                    for a, b in zip(*np.nonzero(~closed[p] & (values[p] < length)))
+                ]
+                if(len(candidates) == 0):
+                    break
+                candidates.sort()
+                tasks = []
+                for value, p, a, b in candidates[:self.workers]:
+                    cutoff = None
+                    if(length < np.inf):
+                        cutoff = math.ceil(length - value + costs[p][a, b] - 1e-6)
+                    time_limit = None
+                    if(deadline is not None):
+                        time_limit = deadline - get_time()
+                        if(time_limit <= 0):
+                            break
+                    tasks.append(("mip", p, matrices[p], int(a), int(b), cutoff, time_limit))
+                for result in run(solve_subproblem, tasks):
+                    store(result)
+                if(log):
+                    print(f"DEC: round {self.rounds}, lower bound {lowerBound:.0f}, best route {length}")
+        finally:
+            if(executor is not None):
+                executor.shutdown()
+
+        self.lowerBound = math.ceil(lowerBound - 1e-6)
+        if(length < np.inf):
+            route = [0]
+            for p, (a, b) in enumerate(pairs):
+                route += [self.V_P[p][v] for v in paths[p][a, b]]
+            route.append(0)
+            length = int(length)
+        else:
+            self.bounds = CombinatorialBounds.compute_bounds(self.data, time_limit=(time / 10 if time != None else None))
+            route, length = self.bounds["heuristic_route"], self.bounds["upper_bound"]
+        self.exact = self.lowerBound >= length
+        if(log):
+            print(f"DEC: route of length {length} ({'optimal' if self.exact else f'lower bound {self.lowerBound}'}), {self.subproblemsSolved} subproblems")
+
+        self.objVal = length
+        self.routeList = route
+        self.route = [(route[k], route[k+1]) for k in range(len(route) - 1)]
+        self.runtime = get_time() - start
+        self.timedOut = deadline is not None and get_time() >= deadline
+
+    def getModelSize(self):
+        return {"vertices": self.n, "clusters": self.P, "max_cluster_size": max(len(vertices) for vertices in self.V_P)}
+
+    def getSolutionData(self):
+        data = DP_CTSP_d_Model.getSolutionData(self)
+        if(self.workers is not None):
+            data["decomposition"] = {
+                "subproblems_solved": self.subproblemsSolved,
+                "rounds": self.rounds,
+                "workers": self.workers
+            }
+        return data
@@ -0,0 +1,313 @@
+import heapq
+
+from time import time as get_time
+
+import numpy as np
+
+import CombinatorialBounds
+from SharedDistances import as_distance_matrix
+
+# Largest cluster solved by the array based d = 0 dynamic programming
+# (its state table has 2^k * k entries).
+MAX_ARRAY_CLUSTER_SIZE = 16
+
+DEFAULT_MAX_STATES = 20000
+DEFAULT_WINDOW = 8
+
+# States expanded between two checks of the deadline inside a layer.
+DEADLINE_CHECK_STATES = 1024
+
+INF = np.iinfo(np.int64).max // 4
+
+# Gurobi status codes (GRB.OPTIMAL, GRB.TIME_LIMIT, GRB.SUBOPTIMAL), so the run summaries
+# of every model have the same status type without importing gurobipy.
+STATUS_OPTIMAL = 2
+STATUS_TIME_LIMIT = 9
+STATUS_SUBOPTIMAL = 13
+
+def held_karp_table(Dc, start_costs):
+    """Held-Karp dynamic programming over the k vertices of a cluster with distances Dc (NumPy
+    arrays): table[mask, last] is the cheapest path visiting the vertices of mask and ending at
+    last, started at each vertex v at cost start_costs[v] (INF where it cannot start).
+    Returns the table and the parent table (previous vertex of each state, -1 at the start)."""
+    k = len(Dc)
+    bits = np.left_shift(1, np.arange(k))
+    Dc = Dc.astype(np.int64)
+    table = np.full((1 << k, k), INF, dtype=np.int64)
+    parent = np.full((1 << k, k), -1, dtype=np.int8)
+    table[bits, np.arange(k)] = start_costs
+    for mask in range(1, 1 << k):
+        row = table[mask]
+        free = np.nonzero((mask & bits) == 0)[0]
+        if(len(free) == 0 or row.min() >= INF):
+            continue
+        candidates = row[:, None] + Dc[:, free]
+        best_from = candidates.argmin(axis=0)
+        best = candidates[best_from, np.arange(len(free))]
+        targets = mask | bits[free]
+        better = best < table[targets, free]
+        table[targets[better], free[better]] = best[better]
+        parent[targets[better], free[better]] = best_from[better]
+    return table, parent
+
+def held_karp_path(parent, last):
+    """Backtracks in a Held-Karp parent table the path through all the cluster vertices ending at last."""
+    mask = len(parent) - 1
+    path = []
+    b = last
+    while(b != -1):
+        path.append(b)
+        a = int(parent[mask, b])
+        mask ^= 1 << b
+        b = a
+    path.reverse()
+    return path
+
+def ordered_clusters_dp(D, V_P):
+    """Exact dynamic programming for d = 0, when the clusters are visited strictly in order.
+    Each cluster is a Held-Karp table over its own vertices, started from the best arrival
+    cost at each vertex from the exits of the previous cluster.
+    Returns the optimal route and its length."""
+    exits = np.array([0])
+    exit_costs = np.zeros(1, dtype=np.int64)
+    backtracking = []
+    for vertices in V_P:
+        C = np.array(vertices)
+        arrive = exit_costs[:, None] + D[np.ix_(exits, C)]
+        table, parent = held_karp_table(D[np.ix_(C, C)], arrive.min(axis=0))
+        backtracking.append((C, parent, arrive.argmin(axis=0)))
+        exits = C
+        exit_costs = table[-1]
+
+    total = exit_costs + D[exits, 0]
+    last = int(total.argmin())
+    length = int(total[last])
+
+    segments = []
+    for C, parent, entry_from in reversed(backtracking):
+        path = held_karp_path(parent, last)
+        segments.append(C[path].tolist())
+        last = int(entry_from[path[0]])
+    route = [0]
+    for segment in reversed(segments):
+        route += segment
+    route.append(0)
+    return route, length
+
+def restricted_dp(D, cluster, V_P, d, max_states=None, reference=None, window=None, deadline=None):
+    """Dynamic programming over the routes respecting the d-relaxed priority rule.
+
+    A state of layer t (t vertices visited) is (m, mask, last): m is the first cluster not yet
+    completed, mask the bitset of the visited vertices of the clusters m..m+d (the only ones
+    that can be partially visited) and last the last visited vertex. So the state space is
+    restricted to windows of d + 1 clusters, as in the Balas-Simonetti dynamic programming.
+
+    With a reference route and a window k, a vertex can only be visited after all the vertices
+    at least k positions before it in the reference (Balas-Simonetti neighbourhood). With
+    max_states, only the cheapest states of each layer are kept (beam search), and after the
+    deadline the expansion of the current layer stops and the search goes on greedily.
+
+    Returns the best route found, its length and whether it is proven optimal (for the
+    neighbourhood, when a reference is given)."""
+    n = len(D)
+    P = len(V_P)
+    rows = D.tolist()
+    cluster_bits = [sum(1 << v for v in vertices) for vertices in V_P]
+    if(reference is not None):
+        reference_order = reference[1:-1]
+        reference_position = [0] * n
+        for pos, v in enumerate(reference_order):
+            reference_position[v] = pos
+
+    layer = {(0, 0, 0): (0, 0)}
+    parents = []
+    exact = True
+    for _ in range(n - 1):
+        new_layer = dict()
+        new_parents = dict()
+        for expanded, (key, (cost, L)) in enumerate(layer.items()):
+            if(deadline is not None and len(new_layer) > 0 and expanded % DEADLINE_CHECK_STATES == 0 and get_time() > deadline):
+                exact = False
+                break
+            m, mask, last = key
+            row = rows[last]
+            for c in range(m, min(P, m + d + 1)):
+                for v in V_P[c]:
+                    if((mask >> v) & 1):
+                        continue
+                    if(reference is not None and reference_position[v] >= L + window):
+                        continue
+                    new_cost = cost + row[v]
+                    new_m = m
+                    new_mask = mask | (1 << v)
+                    while(new_m < P and (new_mask & cluster_bits[new_m]) == cluster_bits[new_m]):
+                        new_mask &= ~cluster_bits[new_m]
+                        new_m += 1
+                    new_key = (new_m, new_mask, v)
+                    old = new_layer.get(new_key)
+                    if(old is None or new_cost < old[0]):
+                        new_L = L
+                        if(reference is not None):
+                            while(new_L < n - 1 and (
+                                cluster[reference_order[new_L]] < new_m or
+                                (new_mask >> reference_order[new_L]) & 1)):
+                                new_L += 1
+                        new_layer[new_key] = (new_cost, new_L)
+                        new_parents[new_key] = key
+        limit = max_states
+        if(deadline is not None and get_time() > deadline):
+            limit = 1
+        if(limit is not None and len(new_layer) > limit):
+            exact = False
+            kept = heapq.nsmallest(limit, new_layer.items(), key=lambda item: item[1][0])
+            new_layer = dict(kept)
+            new_parents = {key: new_parents[key] for key in new_layer}
+        if(len(new_layer) == 0):
+            return None, None, False
+        parents.append(new_parents)
+        layer = new_layer
+
+    best_key = min(layer, key=lambda key: layer[key][0] + rows[key[2]][0])
+    length = layer[best_key][0] + rows[best_key[2]][0]
+    route = [0]
+    key = best_key
+    for new_parents in reversed(parents):
+        route.append(key[2])
+        key = new_parents[key]
+    route.append(0)
+    route.reverse()
+    return route, length, exact
+
+def improve_route(D, cluster, V_P, d, route, window=DEFAULT_WINDOW, max_states=None, deadline=None):
+    """Large neighbourhood search: repeats the Balas-Simonetti dynamic programming around
+    the current route until it stops improving. Returns the route and its length."""
+    length = CombinatorialBounds.route_length(D, route)
+    while(deadline is None or get_time() < deadline):
+        new_route, new_length, _ = restricted_dp(D, cluster, V_P, d, max_states, route, window, deadline)
+        if(new_route is None or new_length >= length):
+            break
+        route, length = new_route, new_length
+    return route, length
+
+class DP_CTSP_d_Model(object):
+    """Class to solve the CTSP_d by the restricted dynamic programming engine, giving
+    optimal routes when the state space fits (e.g. d = 0 and small clusters) and
+    otherwise routes improved by Balas-Simonetti neighbourhoods, bounded by the
+    combinatorial lower bounds."""
+
+    alias = "DP"
+
+    def __init__(self, data, relax=False, memLimit=None):
+        self.data = data
+        self.D = as_distance_matrix(self.data["distances"])
+        self.n = len(self.D)
+        self.V = set(range(self.n))
+        self.V_P = self.data["V_P"]
+        self.P = len(self.V_P)
+        self.d = self.data["d"]
+        self.cluster = CombinatorialBounds.get_vertex_cluster(self.data)
+
+        self.maxStates = DEFAULT_MAX_STATES
+        self.window = DEFAULT_WINDOW
+
+        self.route = []
+        self.routeList = []
+        self.bounds = None
+        self.callbacks = []
+        self.rootBound = None
+
+        self.objVal = None
+        self.lowerBound = None
+        self.exact = False
+        self.timedOut = False
+        self.runtime = 0
+
+    def solve(self, time=None, heur=None, log=0, useBounds=False, rcFixing=False, threads=None, lnsWindow=None, seed=None, useProfile=True, parameters=None):
+        start = get_time()
+        deadline = start + time if time != None else None
+        if(lnsWindow != None):
+            self.window = lnsWindow
+
+        if(self.d == 0 and max(len(vertices) for vertices in self.V_P) <= MAX_ARRAY_CLUSTER_SIZE):
+            route, length = ordered_clusters_dp(self.D, self.V_P)
+            self.exact = True
+        else:
+            route, length, self.exact = restricted_dp(
+                self.D, self.cluster, self.V_P, self.d, self.maxStates, deadline=deadline
+            )
+        if(log):
+            print(f"DP: route of length {length} ({'optimal' if self.exact else 'restricted states'})")
+
+        if(not self.exact):
+            self.bounds = CombinatorialBounds.compute_bounds(
+                self.data, time_limit=(time / 10 if time != None else None)
+            )
+            if(route is None or self.bounds["upper_bound"] < length):
+                route, length = self.bounds["heuristic_route"], self.bounds["upper_bound"]
+            route, length = improve_route(
+                self.D, self.cluster, self.V_P, self.d, route, self.window, deadline=deadline
+            )
+            self.lowerBound = self.bounds["lower_bound"]
+            if(log):
+                print(f"DP: route of length {length} after the neighbourhood search, lower bound {self.lowerBound}")
+        else:
+            self.lowerBound = length
+
+        self.objVal = length
+        self.routeList = route
+        self.route = [(route[k], route[k+1]) for k in range(len(route) - 1)]
+        self.runtime = get_time() - start
+        self.timedOut = deadline is not None and get_time() >= deadline
+
+    def getStatus(self):
+        """Gurobi status code of the last solve: optimal, time limit reached, or stopped
+        without proving optimality (restricted states or neighbourhood search)."""
+        if(self.exact):
+            return STATUS_OPTIMAL
+        if(self.timedOut):
+            return STATUS_TIME_LIMIT
+        return STATUS_SUBOPTIMAL
+
+    def getGap(self):
+        if(self.objVal is None):
+            return None
+        if(self.objVal == 0):
+            return 0.0
+        return max(0.0, (self.objVal - self.lowerBound) / self.objVal)
+
+    def getModelSize(self):
+        return {"vertices": self.n, "clusters": self.P}
+
+    def getRunSummary(self):
+        return {
+            "status": self.getStatus(),
+            "objective": self.objVal,
+            "gap": self.getGap(),
+            "runtime": self.runtime
+        }
+
+    def getSolutionData(self):
+        data = dict()
+        if(self.objVal is not None):
+            data["objective_value"] = self.objVal
+            data["runtime"] = self.runtime
+            data["GAP"] = self.getGap()
+            data["route"] = self.routeList
+            data["x_vars"] = {str(pair): 1.0 for pair in self.route}
+            data["lower_bound"] = self.lowerBound
+        if(self.bounds is not None):
+            data["bounds"] = {
+                key: value for (key, value) in self.bounds.items() if key != "heuristic_route"
+            }
+        return data
+
+    def printRoute(self):
+        if (self.route == []):
+            print("No route available up to this moment!")
+            return
+        print("\nROUTE BUILT:\n")
+        for item in self.routeList[:-1]:
+            print(f"{item} -> ", end="")
+        print("0", end="")
+        print('\n')
+        return
@@ -0,0 +1,250 @@
+import json
+import time
+import queue
+import datetime
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOG_TAB = "    "
+
+GAP_BUCKETS = [0.0, 1e-4, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, float("inf")]
+
+class Metrics(object):
+    """Thread safe counters, gauges and a gap histogram describing a batch of jobs."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.counters = {
+            "jobs_started": 0,
+            "jobs_finished": 0,
+            "jobs_skipped": 0,
+            "jobs_failed": 0,
+            "incumbents_found": 0
+        }
+        self.gauges = {
+            "jobs_in_flight": 0,
+            "jobs_total": 0
+        }
+        self.gap_buckets = [0] * len(GAP_BUCKETS)
+        self.gap_count = 0
+        self.gap_sum = 0.0
+        self.runtime_sum = 0.0
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def add_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = self.gauges.get(name, 0) + value
+
+    def observe_result(self, runtime, gap):
+        with self.lock:
+            if(runtime is not None):
+                self.runtime_sum += runtime
+            if(gap is not None):
+                self.gap_count += 1
+                self.gap_sum += gap
+                for k, limit in enumerate(GAP_BUCKETS):
+                    if(gap <= limit):
+                        self.gap_buckets[k] += 1
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.time() - self.start_time
+            return {
+                "uptime_seconds": elapsed,
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "throughput_jobs_per_hour": 3600 * self.counters["jobs_finished"] / elapsed if elapsed > 0 else 0.0,
+                "gap_histogram": {
+                    "buckets": {str(limit): count for (limit, count) in zip(GAP_BUCKETS, self.gap_buckets)},
+                    "count": self.gap_count,
+                    "sum": self.gap_sum
+                },
+                "runtime_sum_seconds": self.runtime_sum
+            }
+
+    def to_prometheus(self):
+        """Renders the metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in snapshot["counters"].items():
+            lines.append(f"# TYPE ctsp_d_{name}_total counter")
+            lines.append(f"ctsp_d_{name}_total {value}")
+        for name, value in snapshot["gauges"].items():
+            lines.append(f"# TYPE ctsp_d_{name} gauge")
+            lines.append(f"ctsp_d_{name} {value}")
+        lines.append("# TYPE ctsp_d_throughput_jobs_per_hour gauge")
+        lines.append(f"ctsp_d_throughput_jobs_per_hour {snapshot['throughput_jobs_per_hour']}")
+        lines.append("# TYPE ctsp_d_gap histogram")
+        for limit, count in snapshot["gap_histogram"]["buckets"].items():
+            le = "+Inf" if limit == "inf" else limit
+            lines.append(f'ctsp_d_gap_bucket{{le="{le}"}} {count}')
+        lines.append(f"ctsp_d_gap_sum {snapshot['gap_histogram']['sum']}")
+        lines.append(f"ctsp_d_gap_count {snapshot['gap_histogram']['count']}")
+        lines.append("# TYPE ctsp_d_runtime_seconds_sum counter")
+        lines.append(f"ctsp_d_runtime_seconds_sum {snapshot['runtime_sum_seconds']}")
+        return "\n".join(lines) + "\n"
+
+def start_metrics_server(metrics, port, host="127.0.0.1"):
+    """Serves the metrics on http://host:port/metrics (Prometheus format) and /metrics.json
+    from a daemon thread. Returns the server, to be stopped with shutdown()."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if(self.path == "/metrics"):
+                body = metrics.to_prometheus().encode()
+                content_type = "text/plain; version=0.0.4"
+            elif(self.path == "/metrics.json"):
+                body = json.dumps(metrics.snapshot()).encode()
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            return
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class EventLog(object):
+    """Structured event stream of a solution process. Every event is one JSON line with its
+    timestamp, name and fields. emit() only puts the event in a queue: a background thread
+    does the JSON encoding, the (buffered) file writes and the console messages, so the
+    solver threads never wait for I/O."""
+    def __init__(self, path=None, console_level=0, metrics=None, flush_interval=1.0):
+        self.path = path
+        self.console_level = console_level
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.flush_interval = flush_interval
+        self.queue = queue.SimpleQueue()
+        self.file = open(self.path, "a", buffering=1 << 16) if self.path is not None else None
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def emit(self, event, level=None, msg=None, **fields):
+        """Registers an event. If level and msg are given, msg is also printed to the
+        console (indented by level) when level is not above the console level."""
+        self.queue.put((time.time(), event, level, msg, fields))
+
+    def _writer(self):
+        last_flush = time.time()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            if(item is not None):
+                if(item[1] is None):
+                    break
+                timestamp, event, level, msg, fields = item
+                if(self.file is not None):
+                    record = {
+                        "time": datetime.datetime.fromtimestamp(timestamp).isoformat(),
+                        "event": event
+                    }
+                    record.update(fields)
+                    self.file.write(json.dumps(record, default=str) + "\n")
+                if(msg is not None and level is not None and level <= self.console_level):
+                    print((level - 1) * LOG_TAB + msg)
+            if(self.file is not None and time.time() - last_flush >= self.flush_interval):
+                self.file.flush()
+                last_flush = time.time()
+        if(self.file is not None):
+            self.file.flush()
+
+    def close(self):
+        """Writes the pending events and closes the file."""
+        self.queue.put((time.time(), None, None, None, None))
+        self.thread.join()
+        if(self.file is not None):
+            self.file.close()
+            self.file = None
+
+    # Events of the solution process:
+
+    def run_started(self, solver_alias, instance_name, level=3, msg=None):
+        self.metrics.increment("jobs_started")
+        self.metrics.add_gauge("jobs_in_flight", 1)
+        self.emit("run_started", level, msg, solver_alias=solver_alias, instance_name=instance_name)
+
+    def model_built(self, solver_alias, instance_name, build_time, **fields):
+        self.emit("model_built", solver_alias=solver_alias, instance_name=instance_name, build_time=build_time, **fields)
+
+    def incumbent_improved(self, solver_alias, instance_name, objective, bound, runtime):
+        self.metrics.increment("incumbents_found")
+        self.emit(
+            "incumbent_improved", solver_alias=solver_alias, instance_name=instance_name,
+            objective=objective, bound=bound, runtime=runtime
+        )
+
+    def run_finished(self, solver_alias, instance_name, status=None, objective=None, gap=None, runtime=None, level=None, msg=None):
+        self.metrics.increment("jobs_finished")
+        self.metrics.add_gauge("jobs_in_flight", -1)
+        self.metrics.observe_result(runtime, gap)
+        self.emit(
+            "run_finished", level, msg, solver_alias=solver_alias, instance_name=instance_name,
+            status=status, objective=objective, gap=gap, runtime=runtime
+        )
+
+    def run_failed(self, solver_alias, instance_name, error, level=1, msg=None):
+        self.metrics.increment("jobs_failed")
+        self.metrics.add_gauge("jobs_in_flight", -1)
+        self.emit("run_failed", level, msg, solver_alias=solver_alias, instance_name=instance_name, error=error)
+
+    def skipped(self, solver_alias, instance_name, reason, level=4, msg=None):
+        self.metrics.increment("jobs_skipped")
+        self.emit("skipped", level, msg, solver_alias=solver_alias, instance_name=instance_name, reason=reason)
+
+    def forward_from(self, events_queue):
+        """Replays in this EventLog the events put in events_queue by RemoteEventLog
+        instances of worker processes, until None is received. Returns the thread."""
+        def forward():
+            while True:
+                item = events_queue.get()
+                if(item is None):
+                    break
+                method, args, kwargs = item
+                getattr(self, method)(*args, **kwargs)
+        thread = threading.Thread(target=forward, daemon=True)
+        thread.start()
+        return thread
+
+class RemoteEventLog(object):
+    """Stand-in for an EventLog inside a worker process: every event call is sent through a
+    multiprocessing queue and replayed by the EventLog of the main process (see EventLog.forward_from)."""
+    def __init__(self, events_queue):
+        self.events_queue = events_queue
+
+    def _forward(self, method, *args, **kwargs):
+        self.events_queue.put((method, args, kwargs))
+
+    def emit(self, *args, **kwargs):
+        self._forward("emit", *args, **kwargs)
+
+    def run_started(self, *args, **kwargs):
+        self._forward("run_started", *args, **kwargs)
+
+    def model_built(self, *args, **kwargs):
+        self._forward("model_built", *args, **kwargs)
+
+    def incumbent_improved(self, *args, **kwargs):
+        self._forward("incumbent_improved", *args, **kwargs)
+
+    def run_finished(self, *args, **kwargs):
+        self._forward("run_finished", *args, **kwargs)
+
+    def run_failed(self, *args, **kwargs):
+        self._forward("run_failed", *args, **kwargs)
@@ -1,6 +1,7 @@
 import os
 import re
 import json
+import fnmatch
 
 import PATHS
 
@@ -46,3 +47,27 @@ def load_200_vertices_clustered_instances_list():
         item for item in os.listdir(PATHS.INSTANCES_FOLDER) 
             if pattern.match(item)
     ]
+
+def load_all_instances_list():
+    return sorted(
+        item for item in os.listdir(PATHS.INSTANCES_FOLDER) 
+            if item.endswith(".json")
+    )
+
+def filter_instances_list(pattern, instances_list=None):
+    if(instances_list is None):
+        instances_list = load_all_instances_list()
+    return [item for item in instances_list if fnmatch.fnmatch(item, pattern)]
+
+INSTANCES_GROUPS = {
+    "all": load_all_instances_list,
+    "small-random": load_small_random_instances_list,
+    "small-clustered": load_small_clustered_instances_list,
+    "100-random": load_100_vertices_random_instances_list,
+    "100-clustered": load_100_vertices_clustered_instances_list,
+    "200-random": load_200_vertices_random_instances_list,
+    "200-clustered": load_200_vertices_clustered_instances_list
+}
+
+def load_instances_group(group_name):
+    return sorted(INSTANCES_GROUPS[group_name]())
@@ -3,67 +3,129 @@ import sys
 import json
 import datetime
 import platform
-
-import gurobipy as gp
+import importlib
 
 import PATHS
 
-from BasicModels import MTZ_CTSP_d_Model, GP_CTSP_d_Model, SSB_CTSP_d_Model, SST_CTSP_d_Model
-from ValidInequalitiesBaseClass import VI_MTZ_CTSP_d_Model, VI_GP_CTSP_d_Model, VI_SSB_CTSP_d_Model, VI_SST_CTSP_d_Model, VI_Ha_CTSP_d_Model
+# Solver alias -> (module, class). The modules (and gurobipy) are only
+# imported when a solver class is actually requested.
+AVAILABLE_MODELS = {
+    "MTZ1": ("BasicModels", "MTZ_CTSP_d_Model"),
+    "GP1": ("BasicModels", "GP_CTSP_d_Model"),
+    "SSB1": ("BasicModels", "SSB_CTSP_d_Model"),
+    "SST1": ("BasicModels", "SST_CTSP_d_Model"),
+    "MTZ2": ("ValidInequalitiesBaseClass", "VI_MTZ_CTSP_d_Model"),
+    "GP2": ("ValidInequalitiesBaseClass", "VI_GP_CTSP_d_Model"),
+    "SSB2": ("ValidInequalitiesBaseClass", "VI_SSB_CTSP_d_Model"),
+    "SST2": ("ValidInequalitiesBaseClass", "VI_SST_CTSP_d_Model"),
+    "H2020": ("ValidInequalitiesBaseClass", "VI_Ha_CTSP_d_Model"),
+    "DP": ("DynamicProgramming", "DP_CTSP_d_Model"),
+    "DEC": ("Decomposition", "Decomposition_CTSP_d_Model"),
+    "AUTO": ("AutoSelection", "AUTO_CTSP_d_Model")
+}
 
-AVAILABLE_MODELS_LIST = [
-    MTZ_CTSP_d_Model, GP_CTSP_d_Model, SSB_CTSP_d_Model, SST_CTSP_d_Model,
-    VI_MTZ_CTSP_d_Model, VI_GP_CTSP_d_Model, VI_SSB_CTSP_d_Model, VI_SST_CTSP_d_Model,
-    VI_Ha_CTSP_d_Model
-]
+def get_solver_class(solver_alias):
+    module_name, class_name = AVAILABLE_MODELS[solver_alias]
+    return getattr(importlib.import_module(module_name), class_name)
 
 def create_solvers_aliases_dict():
     return {
-        model.alias: model
-        for model in AVAILABLE_MODELS_LIST
+        solver_alias: get_solver_class(solver_alias)
+        for solver_alias in AVAILABLE_MODELS
     }
 
+def get_gurobi_version():
+    try:
+        import gurobipy as gp
+    except ImportError:
+        return None
+    return "Gurobi " + ".".join([str(val) for val in gp.gurobi.version()])
+
 def export_results(
         model, 
-        datetime_on_filename=True):
+        datetime_on_filename=True,
+        time_limit=None):
     data = dict()
     
     data["instance_name"] = model.data["instance_name"]
     data["solver_alias"] = model.alias
     data["python_version"] = sys.version
-    data["gurobi_version"] = "Gurobi " + ".".join([str(val) for val in gp.gurobi.version()])
+    data["gurobi_version"] = get_gurobi_version()
     data["platform"] = platform.platform()
     data["datetime"] = datetime.datetime.now().isoformat()
 
-    if(model.model.SolCount > 0):
-        data["objective_value"] = model.model.ObjVal
-        data["runtime"] = model.model.Runtime
-        data["GAP"] = model.model.MIPGap
-        data["route"] = model.routeList
-        data["x_vars"] = {str(pair): model.x[pair].X for pair in model.x if model.x[pair].X > 0.5}
-        if(len(model.u) > 0):
-            data["u_vars"] = {str(index): model.u[index].X for index in model.u if model.u[index].X > 0.5}
-        if(len(model.y) > 0):
-            data["y_vars"] = {str(pair): model.y[pair].X for pair in model.y if model.y[pair].X > 0.5}
+    summary = model.getRunSummary()
+    data["time_limit"] = time_limit
+    data["status"] = summary["status"]
+    data["runtime"] = summary["runtime"]
+
+    data.update(model.getSolutionData())
+    # Runs of the AUTO alias are stored as AUTO, with the selected formulation in auto_selection.
+    if(hasattr(model, "autoSelection")):
+        data["solver_alias"] = "AUTO"
+        data["auto_selection"] = model.autoSelection
 
     filename = data["solver_alias"] + "_" + data["instance_name"]
     if(datetime_on_filename):
         filename += "_" + datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
     filename += ".json"
 
+    PATHS.ensure_folders([PATHS.RESULTS_FOLDER])
     f = open(os.path.join(PATHS.RESULTS_FOLDER, filename), "w")
     json.dump(data, f)
     f.close()
 
-def print_solution_log(solution_log_level, msg_log_level, msg):
-    LOG_TAB = "    "
-    if(msg_log_level <= solution_log_level):
-        print((msg_log_level-1)*LOG_TAB + msg)
+def get_memory_usage_mb():
+    """Resident memory of this process in MB (None where /proc is not available)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+def get_events_log_path(datetime_on_filename=True):
+    PATHS.ensure_folders([PATHS.LOGS_FOLDER])
+    filename = "events"
+    if(datetime_on_filename):
+        filename += "_" + datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+    return os.path.join(PATHS.LOGS_FOLDER, filename + ".jsonl")
+
+def create_incumbent_callback(event_log, model):
+    """Returns a Gurobi callback that registers every new incumbent of model in event_log."""
+    def incumbent_callback(gurobi_model, where):
+        import gurobipy as gp
+
+        if(where == gp.GRB.Callback.MIPSOL):
+            event_log.incumbent_improved(
+                model.alias,
+                model.data["instance_name"],
+                gurobi_model.cbGet(gp.GRB.Callback.MIPSOL_OBJ),
+                gurobi_model.cbGet(gp.GRB.Callback.MIPSOL_OBJBND),
+                gurobi_model.cbGet(gp.GRB.Callback.RUNTIME)
+            )
+    return incumbent_callback
+
+def get_run_summary(model):
+    """Returns the status, objective value, gap and runtime of a solved model."""
+    return model.getRunSummary()
+
+def run_score(summary, time_limit=None):
+    """Penalized runtime of a run (PAR2), used both to tune the parameters and to select the
+    formulations: runs without solution count as twice the time limit, and runs without proven
+    optimality as the time limit times (1 + gap). Without time limit, the runtime is used."""
+    limit = time_limit if time_limit != None else summary["runtime"]
+    if(summary["objective"] is None):
+        return 2 * limit
+    if(summary["gap"] is not None and summary["gap"] > 1e-4):
+        return limit * (1 + min(summary["gap"], 1))
+    return summary["runtime"]
 
 def get_solved_instances_list_path(solver_alias):
     return os.path.join(PATHS.SOLVED_INSTANCES_FOLDER, solver_alias)
 
 def create_solved_instances_list(solver_alias):
+    PATHS.ensure_folders([PATHS.SOLVED_INSTANCES_FOLDER])
     if(not os.path.isfile(get_solved_instances_list_path(solver_alias))):
         open(get_solved_instances_list_path(solver_alias), "w").close()
 
@@ -0,0 +1,118 @@
+import os
+import json
+import inspect
+import hashlib
+
+import numpy as np
+
+import PATHS
+
+# Compressed MPS keeps the variable names and types, which is all fromFile needs.
+MODEL_FILE_EXTENSION = ".mps.bz2"
+
+# Marks the files still being written (see store_model), which are not cache entries.
+TEMPORARY_MARK = ".tmp"
+
+# Increase when the cache key or the file layout changes.
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_SIZE_LIMIT_MB = 2048
+
+def get_code_version(model_class):
+    """Hash of the source files defining model_class and its base classes, so editing a
+    formulation invalidates its cached models."""
+    digest = hashlib.sha256(str(CACHE_FORMAT_VERSION).encode())
+    for source_file in sorted({inspect.getfile(cls) for cls in model_class.__mro__ if cls is not object}):
+        with open(source_file, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def get_cache_key(data, model_class, relax=False):
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(data["distances"], dtype=np.int32).tobytes())
+    digest.update(json.dumps({"V_P": data["V_P"], "d": data["d"]}).encode())
+    digest.update(json.dumps({
+        "alias": model_class.alias,
+        "relax": bool(relax),
+        "code_version": get_code_version(model_class)
+    }).encode())
+    return model_class.alias + "_" + digest.hexdigest()[:32]
+
+def get_cache_path(key):
+    return os.path.join(PATHS.MODEL_CACHE_FOLDER, key + MODEL_FILE_EXTENSION)
+
+def list_cached_models():
+    """Returns the (path, size, last use time) of the cached models, least recently used first.
+    Files being written by other workers are not listed, so evict never removes them."""
+    if(not os.path.isdir(PATHS.MODEL_CACHE_FOLDER)):
+        return []
+    entries = []
+    for item in os.listdir(PATHS.MODEL_CACHE_FOLDER):
+        if(item.endswith(MODEL_FILE_EXTENSION) and TEMPORARY_MARK not in item):
+            path = os.path.join(PATHS.MODEL_CACHE_FOLDER, item)
+            stat = os.stat(path)
+            entries.append((path, stat.st_size, stat.st_mtime))
+    return sorted(entries, key=lambda entry: entry[2])
+
+def evict(size_limit_mb=DEFAULT_SIZE_LIMIT_MB):
+    """Removes the least recently used models until the cache fits in size_limit_mb."""
+    entries = list_cached_models()
+    total = sum(entry[1] for entry in entries)
+    for path, size, _ in entries:
+        if(total <= size_limit_mb * 1024 * 1024):
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+def store_model(solver, key, size_limit_mb=DEFAULT_SIZE_LIMIT_MB):
+    PATHS.ensure_folders([PATHS.MODEL_CACHE_FOLDER])
+    path = get_cache_path(key)
+    # Written under a temporary name (Gurobi picks the format by the extension)
+    # and renamed, so concurrent workers never read a partial file.
+    temporary_path = os.path.join(PATHS.MODEL_CACHE_FOLDER, f"{key}{TEMPORARY_MARK}{os.getpid()}{MODEL_FILE_EXTENSION}")
+    solver.model.update()
+    solver.model.write(temporary_path)
+    os.replace(temporary_path, path)
+    evict(size_limit_mb)
+
+def load_model(model_class, data, key, relax=False, memLimit=None):
+    """Returns the cached model of key, or None when it is not cached (or was evicted by
+    another worker while being read)."""
+    import gurobipy as gp
+
+    path = get_cache_path(key)
+    if(not os.path.isfile(path)):
+        return None
+    try:
+        # The modification time is the last use time of the LRU eviction.
+        os.utime(path)
+        return model_class.fromFile(data, path, relax, memLimit)
+    except (FileNotFoundError, gp.GurobiError):
+        return None
+
+def build_model(model_class, data, relax=False, memLimit=None, use_cache=True, size_limit_mb=DEFAULT_SIZE_LIMIT_MB, lean=False):
+    """Instantiates model_class for data, reading it from the cache when it was built
+    before, or building and caching it otherwise. Models without fromFile (not built
+    on Gurobi) are always built. With lean, the constraint handles are released after
+    the build (see releaseConstraintHandles). Selector classes (AUTO) are resolved to the
+    selected model class first, so its models are cached too."""
+    autoSelection = None
+    if(hasattr(model_class, "selectModelClass")):
+        model_class, autoSelection = model_class.selectModelClass(data)
+    if(not use_cache or not hasattr(model_class, "fromFile")):
+        solver = model_class(data, relax, memLimit)
+    else:
+        key = get_cache_key(data, model_class, relax)
+        solver = load_model(model_class, data, key, relax, memLimit)
+        if(solver is None):
+            # Named variables: fromFile rebinds them by name.
+            solver = model_class(data, relax, memLimit, names=True)
+            store_model(solver, key, size_limit_mb)
+    if(lean and hasattr(solver, "releaseConstraintHandles")):
+        solver.releaseConstraintHandles()
+    if(autoSelection is not None):
+        solver.autoSelection = autoSelection
+    return solver
@@ -3,13 +3,22 @@ import os
 INSTANCES_FOLDER = os.path.join(".", "Instances")
 RESULTS_FOLDER = os.path.join(".", "Results")
 SOLVED_INSTANCES_FOLDER = os.path.join(".", "Solved_Instances")
+LOGS_FOLDER = os.path.join(".", "Logs")
+MODEL_CACHE_FOLDER = os.path.join(".", "Model_Cache")
+TUNING_PROFILES_FOLDER = os.path.join(".", "Tuning_Profiles")
+AUTO_SELECTION_FOLDER = os.path.join(".", "Auto_Selection")
 
 FOLDERS = [
     INSTANCES_FOLDER,
     RESULTS_FOLDER,
-    SOLVED_INSTANCES_FOLDER
+    SOLVED_INSTANCES_FOLDER,
+    LOGS_FOLDER,
+    MODEL_CACHE_FOLDER,
+    TUNING_PROFILES_FOLDER,
+    AUTO_SELECTION_FOLDER
 ]
 
-for folder in FOLDERS:
-    if not os.path.exists(folder):
-        os.mkdir(folder)
+def ensure_folders(folders=FOLDERS):
+    """Creates the output folders when they do not exist yet (called before writing, not at import)."""
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
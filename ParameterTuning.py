@@ -0,0 +1,180 @@
+import os
+import json
+import random
+import datetime
+import itertools
+
+import PATHS
+
+from InstancesUtils import read_instance
+from MiscUtils import get_solver_class, run_score
+
+PROFILES_FILE = os.path.join(PATHS.TUNING_PROFILES_FOLDER, "profiles.json")
+
+# Parameters explored by the parameter search.
+SEARCH_SPACE = {
+    "MIPFocus": [0, 1, 2, 3],
+    "Cuts": [-1, 0, 1, 2, 3],
+    "Presolve": [-1, 0, 1, 2],
+    "Heuristics": [0.0, 0.05, 0.2],
+    "Symmetry": [-1, 0, 2]
+}
+
+# Parameters set by the tuning itself (limits, threads, output), never saved in a profile.
+UNSAVED_PARAMETERS = {"TimeLimit", "Threads", "OutputFlag", "LogToConsole", "LogFile"}
+
+def get_size_class(n):
+    """Size classes of the instances: swiss42/berlin52, kro*100 and kro*200."""
+    if(n <= 60):
+        return "small"
+    if(n <= 100):
+        return "medium"
+    return "large"
+
+def get_profile_key(solver_alias, n):
+    return f"{solver_alias}|{get_size_class(n)}"
+
+def load_profiles():
+    if(not os.path.isfile(PROFILES_FILE)):
+        return dict()
+    with open(PROFILES_FILE, "r") as f:
+        return json.load(f)
+
+def load_profile(solver_alias, n):
+    """Returns the tuned parameters of solver_alias for instances with n vertices (or None)."""
+    profile = load_profiles().get(get_profile_key(solver_alias, n))
+    return profile["parameters"] if profile is not None else None
+
+def save_profile(solver_alias, size_class, parameters, **info):
+    profiles = load_profiles()
+    profiles[f"{solver_alias}|{size_class}"] = dict(
+        parameters=parameters, datetime=datetime.datetime.now().isoformat(), **info
+    )
+    PATHS.ensure_folders([PATHS.TUNING_PROFILES_FOLDER])
+    temporary_path = PROFILES_FILE + ".tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(profiles, f, indent=4)
+    os.replace(temporary_path, PROFILES_FILE)
+
+def evaluate_parameters(solver_alias, instances_data, parameters, time_limit, threads=None):
+    """Total penalized runtime of solver_alias with the given parameters over the instances."""
+    model_class = get_solver_class(solver_alias)
+    total = 0.0
+    for data in instances_data:
+        solver = model_class(data)
+        solver.solve(time=time_limit, threads=threads, seed=0, useProfile=False, parameters=parameters)
+        total += run_score(solver.getRunSummary(), time_limit)
+        solver.model.dispose()
+        solver.env.dispose()
+    return total
+
+def parameter_search(solver_alias, instances_data, time_limit, trials=10, threads=None, random_seed=0, log=None):
+    """Random search over SEARCH_SPACE (the default parameters are always the first trial).
+    Returns the best parameters found and their score."""
+    grid = list(itertools.product(*SEARCH_SPACE.values()))
+    candidates = [dict()] + [
+        dict(zip(SEARCH_SPACE.keys(), values))
+        for values in random.Random(random_seed).sample(grid, min(trials - 1, len(grid)))
+    ]
+    best_parameters, best_score = None, None
+    for parameters in candidates:
+        score = evaluate_parameters(solver_alias, instances_data, parameters, time_limit, threads)
+        if(log is not None):
+            log(f"{solver_alias}: {parameters or 'default parameters'} -> score {score:.2f}")
+        if(best_score is None or score < best_score):
+            best_parameters, best_score = parameters, score
+    return best_parameters, best_score
+
+def gurobi_tune_instance(solver_alias, data, time_limit, tune_time_limit, threads=None):
+    """Runs Gurobi's tuning tool (model.tune()) on one instance and returns every parameter
+    of its best result that differs from the default (except the UNSAVED_PARAMETERS and
+    the tuning tool parameters)."""
+    import gurobipy as gp
+
+    solver = get_solver_class(solver_alias)(data)
+    solver.model.setParam("TimeLimit", time_limit)
+    solver.model.setParam("TuneTimeLimit", tune_time_limit)
+    if(threads != None):
+        solver.model.setParam("Threads", threads)
+    solver.model.tune()
+    parameters = dict()
+    if(solver.model.TuneResultCount > 0):
+        solver.model.getTuneResult(0)
+        for name in dir(gp.GRB.Param):
+            if(name.startswith("_") or name.startswith("Tune") or name in UNSAVED_PARAMETERS):
+                continue
+            try:
+                info = solver.model.getParamInfo(name)
+            except gp.GurobiError:
+                continue
+            # (name, type, current, min, max, default), or (name, type, current, default) for strings.
+            current, default = info[2], info[-1]
+            if(current != default):
+                parameters[name] = current
+    solver.model.dispose()
+    solver.env.dispose()
+    return parameters
+
+def gurobi_tune(solver_alias, instances_data, time_limit, tune_time_limit, threads=None, log=None):
+    """Runs Gurobi's tuning tool on each training instance (sharing tune_time_limit) and
+    evaluates the parameters found for each one, and the default parameters, over all the
+    training instances. Returns the best parameters and their score."""
+    candidates = [dict()]
+    for data in instances_data:
+        parameters = gurobi_tune_instance(solver_alias, data, time_limit, tune_time_limit / len(instances_data), threads)
+        if(parameters not in candidates):
+            candidates.append(parameters)
+    best_parameters, best_score = None, None
+    for parameters in candidates:
+        score = evaluate_parameters(solver_alias, instances_data, parameters, time_limit, threads)
+        if(log is not None):
+            log(f"{solver_alias}: {parameters or 'default parameters'} -> score {score:.2f}")
+        if(best_score is None or score < best_score):
+            best_parameters, best_score = parameters, score
+    return best_parameters, best_score
+
+def select_training_instances(instances, per_class):
+    """Groups the instances by size class and keeps up to per_class of each, spread over the list."""
+    by_class = dict()
+    for instance in sorted(instances):
+        data = read_instance(instance)
+        by_class.setdefault(get_size_class(len(data["distances"])), []).append(instance)
+    selected = dict()
+    for size_class, items in by_class.items():
+        step = max(1, len(items) // per_class)
+        selected[size_class] = items[::step][:per_class]
+    return selected
+
+def run_tuning(config, event_log):
+    """Tunes every solver of config on a training subset of the instances of each size class
+    and saves the winning parameters as the profile of (solver, size class)."""
+    log = lambda msg: event_log.emit("tuning_trial", 3, msg)
+    training = select_training_instances(config["instances"], config["tune_instances"])
+    for solver_alias in config["solvers"]:
+        if(not hasattr(get_solver_class(solver_alias), "fromFile")):
+            event_log.skipped(solver_alias, None, "not a Gurobi model", level=2, msg=f"Skipped {solver_alias}: it has no Gurobi parameters!")
+            continue
+        for size_class, instances in training.items():
+            event_log.emit(
+                "tuning_started", 2, f"Tuning {solver_alias} on {size_class} instances: {', '.join(instances)}",
+                solver_alias=solver_alias, size_class=size_class, instances=instances
+            )
+            instances_data = [read_instance(instance) for instance in instances]
+            if(config["tune_method"] == "gurobi"):
+                parameters, score = gurobi_tune(
+                    solver_alias, instances_data, config["time_limit"],
+                    config["time_limit"] * config["tune_trials"], config["threads_per_job"], log=log
+                )
+            else:
+                parameters, score = parameter_search(
+                    solver_alias, instances_data, config["time_limit"], config["tune_trials"],
+                    config["threads_per_job"], log=log
+                )
+            save_profile(
+                solver_alias, size_class, parameters, score=score, method=config["tune_method"],
+                training_instances=instances, time_limit=config["time_limit"]
+            )
+            event_log.emit(
+                "tuning_finished", 2, f"Saved profile {solver_alias}|{size_class}: {parameters or 'default parameters'} (score {score:.2f})",
+                solver_alias=solver_alias, size_class=size_class, parameters=parameters, score=score
+            )
@@ -0,0 +1,217 @@
+import os
+import json
+import datetime
+import statistics
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import PATHS
+import ModelCache
+import BatchRunner
+
+from InstancesUtils import read_instance
+from MiscUtils import get_solver_class, get_events_log_path
+from EventLog import EventLog
+from SharedDistances import SharedDistancesPool, attach_distances
+
+def permute_instance(data, permutation_seed):
+    """Returns a copy of data with the vertices 1..n-1 relabeled by a random permutation
+    (the depot stays vertex 0). The instance is the same, only the labels change."""
+    D = np.asarray(data["distances"])
+    n = len(D)
+    rng = np.random.default_rng(permutation_seed)
+    new_label = np.concatenate(([0], 1 + rng.permutation(n - 1)))
+    old_label = np.argsort(new_label)
+    permuted = dict(data)
+    permuted["distances"] = np.ascontiguousarray(D[np.ix_(old_label, old_label)])
+    permuted["V_P"] = [[int(new_label[v]) for v in vertices] for vertices in data["V_P"]]
+    permuted["permutation_seed"] = permutation_seed
+    return permuted
+
+def describe(values):
+    """Median, quartiles, interquartile range and worst case of a sample."""
+    values = sorted(value for value in values if value is not None)
+    if(len(values) == 0):
+        return None
+    if(len(values) == 1):
+        q1 = q3 = values[0]
+    else:
+        q1, _, q3 = statistics.quantiles(values, n=4, method="inclusive")
+    return {
+        "count": len(values),
+        "median": statistics.median(values),
+        "q1": q1,
+        "q3": q3,
+        "iqr": q3 - q1,
+        "mean": statistics.fmean(values),
+        "best": values[0],
+        "worst": values[-1]
+    }
+
+def failed_run(solver_alias, instance, seed, permutation_seed, error):
+    """Record of a run that raised, kept in the sweep (and counted as its worst case)."""
+    return {
+        "solver_alias": solver_alias,
+        "instance_name": instance,
+        "seed": seed,
+        "permutation_seed": permutation_seed,
+        "status": None,
+        "objective": None,
+        "gap": None,
+        "runtime": None,
+        "failed": True,
+        "error": repr(error)
+    }
+
+def run_values(runs, key, failed_value):
+    """Values of key in the runs, failed runs counting as failed_value."""
+    return [failed_value if run.get("failed") else run[key] for run in runs]
+
+def aggregate_runs(runs, time_limit=None):
+    """Aggregates the runtime and gap of the runs of one solver, overall and by instance.
+    Failed runs count as the worst case: the time limit (or the slowest run, without time
+    limit) and a gap of 100%."""
+    finished = [run["runtime"] for run in runs if not run.get("failed")]
+    failed_runtime = time_limit if time_limit != None else max(finished, default=None)
+    aggregates = {
+        "failed": sum(1 for run in runs if run.get("failed")),
+        "runtime": describe(run_values(runs, "runtime", failed_runtime)),
+        "gap": describe(run_values(runs, "gap", 1.0)),
+        "instances": dict()
+    }
+    for instance in sorted({run["instance_name"] for run in runs}):
+        instance_runs = [run for run in runs if run["instance_name"] == instance]
+        aggregates["instances"][instance] = {
+            "failed": sum(1 for run in instance_runs if run.get("failed")),
+            "runtime": describe(run_values(instance_runs, "runtime", failed_runtime)),
+            "gap": describe(run_values(instance_runs, "gap", 1.0)),
+            "objective": describe([run["objective"] for run in instance_runs])
+        }
+    return aggregates
+
+def solve_sweep_run(config, solver_alias, instance, data, distances_descriptor, seed, permutation_seed, threads):
+    """Worker side of a sweep: solves one (solver, instance, seed, labeling) run."""
+    event_log = BatchRunner.WORKER_EVENT_LOG
+    event_log.run_started(solver_alias, instance, msg=f"{solver_alias}: {instance} seed {seed} labeling {permutation_seed}...")
+    try:
+        attach_distances(data, distances_descriptor)
+        if(permutation_seed > 0):
+            data = permute_instance(data, permutation_seed)
+        solver = ModelCache.build_model(
+            get_solver_class(solver_alias), data,
+            use_cache=config["model_cache"], size_limit_mb=config["model_cache_size_mb"],
+            lean=config["lean"]
+        )
+        solver.solve(
+            time=config["time_limit"],
+            log=False,
+            useBounds=config["use_bounds"],
+            rcFixing=config["rc_fixing"],
+            threads=threads,
+            lnsWindow=config["dp_lns_window"],
+            seed=seed,
+            useProfile=config["use_profiles"]
+        )
+    except Exception as error:
+        event_log.run_failed(
+            solver_alias, instance, repr(error),
+            msg=f"{solver_alias}: failed to solve {instance} (seed {seed}, labeling {permutation_seed}): {error!r}"
+        )
+        raise
+    summary = solver.getRunSummary()
+    event_log.run_finished(solver_alias, instance, **summary)
+    run = {
+        "solver_alias": solver_alias,
+        "instance_name": instance,
+        "seed": seed,
+        "permutation_seed": permutation_seed
+    }
+    run.update(summary)
+    return run
+
+def export_sweep(solver_alias, config, runs):
+    PATHS.ensure_folders([PATHS.RESULTS_FOLDER])
+    data = {
+        "solver_alias": solver_alias,
+        "datetime": datetime.datetime.now().isoformat(),
+        "seeds": config["sweep_seeds"],
+        "permutations": config["sweep_permutations"],
+        "time_limit": config["time_limit"],
+        "instances": config["instances"],
+        "aggregates": aggregate_runs(runs, config["time_limit"]),
+        "runs": runs
+    }
+    filename = f"sweep_{solver_alias}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+    with open(os.path.join(PATHS.RESULTS_FOLDER, filename), "w") as f:
+        json.dump(data, f, default=str)
+    return data
+
+def run_sweep(config):
+    """Runs every (solver, instance) job under config["sweep_seeds"] Gurobi seeds and, for
+    each seed, the original labeling plus config["sweep_permutations"] relabelings of the
+    vertices. The runs share config["cores"] cores, config["threads_per_job"] per run.
+    The aggregates of each solver are stored in the Results folder, also when runs fail
+    (they are recorded as failed runs)."""
+    PATHS.ensure_folders()
+    event_log = EventLog(
+        get_events_log_path() if config["export_events"] else None,
+        console_level=config["log_level"]
+    )
+    cores = config["cores"] or os.cpu_count() or 1
+    threads = max(1, min(config["threads_per_job"], cores))
+    workers = max(1, cores // threads)
+    runs_per_job = config["sweep_seeds"] * (1 + config["sweep_permutations"])
+    event_log.metrics.set_gauge("jobs_total", len(config["solvers"]) * len(config["instances"]) * runs_per_job)
+    event_log.emit(
+        "sweep_started", 1, f"Starting seed sweep: {runs_per_job} runs per job, {workers} workers x {threads} threads!",
+        solvers=config["solvers"], instances=config["instances"],
+        seeds=config["sweep_seeds"], permutations=config["sweep_permutations"]
+    )
+
+    try:
+        runs = {solver_alias: [] for solver_alias in config["solvers"]}
+        events_queue = multiprocessing.Queue()
+        forward_thread = event_log.forward_from(events_queue)
+        distances_pool = SharedDistancesPool()
+        try:
+            with ProcessPoolExecutor(workers, initializer=BatchRunner.init_worker, initargs=(events_queue,)) as executor:
+                futures = dict()
+                for instance in config["instances"]:
+                    data = read_instance(instance)
+                    descriptor = distances_pool.get_descriptor(data)
+                    del data["distances"]
+                    for solver_alias in config["solvers"]:
+                        for seed in range(config["sweep_seeds"]):
+                            for permutation_seed in range(config["sweep_permutations"] + 1):
+                                future = executor.submit(
+                                    solve_sweep_run, config, solver_alias, instance, dict(data),
+                                    descriptor, seed, permutation_seed, threads
+                                )
+                                futures[future] = (solver_alias, instance, seed, permutation_seed)
+                for future in as_completed(futures):
+                    try:
+                        run = future.result()
+                    except Exception as error:
+                        run = failed_run(*futures[future], error)
+                    runs[run["solver_alias"]].append(run)
+        finally:
+            events_queue.put(None)
+            forward_thread.join()
+            distances_pool.close()
+
+        for solver_alias in config["solvers"]:
+            aggregates = export_sweep(solver_alias, config, runs[solver_alias])["aggregates"]
+            runtime = aggregates["runtime"]
+            if(runtime is not None):
+                event_log.emit(
+                    "sweep_aggregated", 2,
+                    f"{solver_alias}: runtime median {runtime['median']:.2f}s, IQR {runtime['iqr']:.2f}s, worst {runtime['worst']:.2f}s, {aggregates['failed']} failed",
+                    solver_alias=solver_alias, aggregates=aggregates
+                )
+        event_log.emit("sweep_finished", 1, "Finished seed sweep!", **event_log.metrics.snapshot())
+    finally:
+        event_log.close()
+    return runs
@@ -0,0 +1,90 @@
+import sys
+
+import numpy as np
+
+from multiprocessing import shared_memory
+
+DISTANCES_DTYPE = np.int32
+
+def as_distance_matrix(distances):
+    """Returns the distances as a read-only int32 NumPy array (without copying if it already is one)."""
+    if(isinstance(distances, np.ndarray) and distances.dtype == DISTANCES_DTYPE):
+        return distances
+    D = np.array(distances, dtype=DISTANCES_DTYPE)
+    D.flags.writeable = False
+    return D
+
+def get_base_graph_name(instance_name):
+    """Instances built on the same base graph (e.g. berlin52-C-3-0-a and berlin52-R-5-1-c)
+    share the same distance matrix."""
+    return instance_name.split("-")[0]
+
+class SharedDistanceMatrix(object):
+    """Distance matrix stored once in shared memory. The process that creates it owns the
+    block and must unlink() it; the worker processes attach() to it by name without copying."""
+    def __init__(self, shm, n, owner):
+        self.shm = shm
+        self.n = n
+        self.owner = owner
+        self.array = np.ndarray((n, n), dtype=DISTANCES_DTYPE, buffer=shm.buf)
+        self.array.flags.writeable = False
+
+    @classmethod
+    def create(cls, distances):
+        D = as_distance_matrix(distances)
+        shm = shared_memory.SharedMemory(create=True, size=D.nbytes)
+        shared = np.ndarray(D.shape, dtype=DISTANCES_DTYPE, buffer=shm.buf)
+        shared[:] = D
+        del shared
+        return cls(shm, D.shape[0], True)
+
+    @classmethod
+    def attach(cls, descriptor):
+        name, n = descriptor
+        if(sys.version_info >= (3, 13)):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # Worker processes share the resource tracker of the process that created
+            # the block, so attaching does not register it a second time.
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, n, False)
+
+    def descriptor(self):
+        """Picklable (name, n) pair used by attach()."""
+        return (self.shm.name, self.n)
+
+    def close(self):
+        del self.array
+        self.shm.close()
+
+    def unlink(self):
+        self.close()
+        if(self.owner):
+            self.shm.unlink()
+
+class SharedDistancesPool(object):
+    """Keeps one shared distance matrix per base graph for the lifetime of a batch."""
+    def __init__(self):
+        self.matrices = dict()
+
+    def get_descriptor(self, data):
+        base_graph = get_base_graph_name(data["instance_name"])
+        if(base_graph not in self.matrices):
+            self.matrices[base_graph] = SharedDistanceMatrix.create(data["distances"])
+        return self.matrices[base_graph].descriptor()
+
+    def close(self):
+        for matrix in self.matrices.values():
+            matrix.unlink()
+        self.matrices = dict()
+
+# Matrices attached by this process, by shared memory block name.
+ATTACHED_MATRICES = dict()
+
+def attach_distances(data, descriptor):
+    """Completes data (an instance without "distances") with a zero-copy view of the shared
+    matrix. Attachments are kept per process, so every worker attaches each block only once."""
+    if(descriptor[0] not in ATTACHED_MATRICES):
+        ATTACHED_MATRICES[descriptor[0]] = SharedDistanceMatrix.attach(descriptor)
+    data["distances"] = ATTACHED_MATRICES[descriptor[0]].array
+    return data
@@ -6,7 +6,11 @@ from InstancesUtils import *
 
 GUROBI_PARAMETERS = {
     "MAX_RUNTIME": 3600,
-    "PRINT_LOG": False
+    "PRINT_LOG": False,
+    "USE_COMBINATORIAL_BOUNDS": False,
+    "REDUCED_COST_FIXING": False,
+    "DP_LNS_WINDOW": None,
+    "LEAN_MODELS": False
 }
 
 EXPORT_SOLUTION_PARAMETERS = {
@@ -14,10 +18,38 @@ EXPORT_SOLUTION_PARAMETERS = {
     "DATETIME_ON_FILENAME": False
 }
 
+MODEL_CACHE_PARAMETERS = {
+    "USE_MODEL_CACHE": False,
+    "SIZE_LIMIT_MB": 2048
+}
+
+PARALLEL_PARAMETERS = {
+    "WORKERS": 1
+}
+
+SWEEP_PARAMETERS = {
+    "SEEDS": 5,
+    "PERMUTATIONS": 0,
+    "CORES": None,
+    "THREADS_PER_JOB": 1
+}
+
+TUNING_PARAMETERS = {
+    "USE_PROFILES": True,
+    "METHOD": "search",
+    "TRIALS": 10,
+    "INSTANCES_PER_SIZE_CLASS": 3
+}
+
 USE_SOLVED_INSTANCES_LIST = True
 
 SOLUTION_LOG_LEVEL = 4
 
+EVENT_LOG_PARAMETERS = {
+    "EXPORT_EVENTS": True,
+    "METRICS_PORT": None
+}
+
 SOLVERS_LIST = ["MTZ2", "H2020"]
 
 INSTANCES_LIST = [
@@ -3,8 +3,8 @@ from BasicModels import CTSP_d_BaseModel
 
 class VI_BaseModel(CTSP_d_BaseModel):
     """Class to add common valid inequalities to the proposed models."""
-    def __init__(self, data, relax=False, memLimit=None):
-        CTSP_d_BaseModel.__init__(self, data, relax, memLimit)
+    def __init__(self, data, relax=False, memLimit=None, names=False):
+        CTSP_d_BaseModel.__init__(self, data, relax, memLimit, names)
 
         # Ha et. al. 2020 valid inequalities:
         self.c_Ha_16 = self.model.addConstrs(
@@ -27,14 +27,14 @@ class VI_MTZ_CTSP_d_Model(VI_BaseModel):
     
     alias = "MTZ2"
     
-    def __init__(self, data, relax=False, memLimit=None):
-        VI_BaseModel.__init__(self, data, relax, memLimit)
+    def __init__(self, data, relax=False, memLimit=None, names=False):
+        VI_BaseModel.__init__(self, data, relax, memLimit, names)
 
         if(relax):
-            self.u = self.model.addVars(self.V, ub = self.n - 1)
+            self.u = self.model.addVars(self.V, ub = self.n - 1, name = self.varName("u"))
         else:
             #self.u = self.model.addVars(self.V, vtype = gp.GRB.INTEGER, ub = self.n - 1)
-            self.u = self.model.addVars(self.V, ub = self.n - 1)
+            self.u = self.model.addVars(self.V, ub = self.n - 1, name = self.varName("u"))
 
         # Valid inequalities presented in Ha et. al. (2020):
         self.c_Ha_15 = self.model.addConstrs(
@@ -109,13 +109,13 @@ class VI_GP_CTSP_d_Model(VI_BaseModel):
     
     alias = "GP2"
     
-    def __init__(self, data, relax=False, memLimit=None):
-        VI_BaseModel.__init__(self, data, relax, memLimit)
+    def __init__(self, data, relax=False, memLimit=None, names=False):
+        VI_BaseModel.__init__(self, data, relax, memLimit, names)
 
         if(relax):
-            self.y = self.model.addVars(self.A)
+            self.y = self.model.addVars(self.A, name = self.varName("y"))
         else:
-            self.y = self.model.addVars(self.A, vtype = gp.GRB.BINARY)
+            self.y = self.model.addVars(self.A, vtype = gp.GRB.BINARY, name = self.varName("y"))
         
         self.non_zero_i_j = [
             (i, j) for (i, j) in self.A if (i * j) > 0
@@ -188,13 +188,13 @@ class VI_SSB_CTSP_d_Model(VI_BaseModel):
     
     alias = "SSB2"
     
-    def __init__(self, data, relax=False, memLimit=None):
-        VI_BaseModel.__init__(self, data, relax, memLimit)
+    def __init__(self, data, relax=False, memLimit=None, names=False):
+        VI_BaseModel.__init__(self, data, relax, memLimit, names)
 
         if(relax):
-            self.y = self.model.addVars(self.A)
+            self.y = self.model.addVars(self.A, name = self.varName("y"))
         else:
-            self.y = self.model.addVars(self.A, vtype = gp.GRB.BINARY)
+            self.y = self.model.addVars(self.A, vtype = gp.GRB.BINARY, name = self.varName("y"))
         
         self.non_zero_i_j = [(i, j) for (i, j) in self.A if (i * j) > 0]
 
@@ -265,8 +265,8 @@ class VI_SST_CTSP_d_Model(VI_BaseModel):
     
     alias = "SST2"
     
-    def __init__(self, data, relax=False, memLimit=None):
-        VI_BaseModel.__init__(self, data, relax, memLimit)
+    def __init__(self, data, relax=False, memLimit=None, names=False):
+        VI_BaseModel.__init__(self, data, relax, memLimit, names)
 
         self.non_zero_i_j_k = [
             (i, j, k) for i in self.V for j in self.V for k in self.V 
@@ -274,11 +274,11 @@ class VI_SST_CTSP_d_Model(VI_BaseModel):
         ]
 
         if(relax):
-            self.y = self.model.addVars(self.A)
-            self.t = self.model.addVars(self.non_zero_i_j_k)
+            self.y = self.model.addVars(self.A, name = self.varName("y"))
+            self.t = self.model.addVars(self.non_zero_i_j_k, name = self.varName("t"))
         else:
-            self.y = self.model.addVars(self.A, vtype = gp.GRB.BINARY)
-            self.t = self.model.addVars(self.non_zero_i_j_k, vtype = gp.GRB.BINARY)
+            self.y = self.model.addVars(self.A, vtype = gp.GRB.BINARY, name = self.varName("y"))
+            self.t = self.model.addVars(self.non_zero_i_j_k, vtype = gp.GRB.BINARY, name = self.varName("t"))
 
         self.SST_51 = self.model.addConstrs(
            self.y[i, j] + self.x[j, i] + self.y[j, k] + self.y[k, i] <= 2
@@ -289,6 +289,8 @@ class VI_SST_CTSP_d_Model(VI_BaseModel):
             self.t[i, j, k] <= self.x[i, k] for (i, j, k) in self.non_zero_i_j_k
         )
 
+        del self.non_zero_i_j_k
+
         self.non_zero_i_j = [(i, j) for (i, j) in self.A if (i * j) > 0]
 
         self.SST_49 = self.model.addConstrs(
@@ -355,14 +357,14 @@ class VI_Ha_CTSP_d_Model(VI_BaseModel):
     
     alias = "H2020"
     
-    def __init__(self, data, relax=False, memLimit=None):
-        VI_BaseModel.__init__(self, data, relax, memLimit)
+    def __init__(self, data, relax=False, memLimit=None, names=False):
+        VI_BaseModel.__init__(self, data, relax, memLimit, names)
 
         if(relax):
-            self.u = self.model.addVars(self.V, ub = self.n - 1)
+            self.u = self.model.addVars(self.V, ub = self.n - 1, name = self.varName("u"))
         else:
             #self.u = self.model.addVars(self.V, vtype = gp.GRB.INTEGER, ub = self.n - 1)
-            self.u = self.model.addVars(self.V, ub = self.n - 1)
+            self.u = self.model.addVars(self.V, ub = self.n - 1, name = self.varName("u"))
 
         # Valid inequalities presented in Ha et. al. (2020):
         self.c_Ha_15 = self.model.addConstrs(
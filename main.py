@@ -1,45 +1,228 @@
 #!/usr/bin/python3
+"""Command line entry point of the CTSP_d solution process.
 
-from InstancesUtils import *
-from MiscUtils import *
-from UserInputs import *
-
-print_solution_log(SOLUTION_LOG_LEVEL, 1, "Starting Solution Process!")
-
-model = create_solvers_aliases_dict()
-
-solver_count = 1
-for solver_alias in SOLVERS_LIST:
-    print_solution_log(SOLUTION_LOG_LEVEL, 2, f"Actual Solver: {solver_alias} ({solver_count}/{len(SOLVERS_LIST)})")
-    if(USE_SOLVED_INSTANCES_LIST):
-        if(not os.path.isfile(get_solved_instances_list_path(solver_alias))):
-            create_solved_instances_list(solver_alias)
-            solved_instances_list = set()
-        else:
-            solved_instances_list = load_solved_instances_list(solver_alias)
-    instances_count = 1
-    for instance in INSTANCES_LIST:
-        print_solution_log(SOLUTION_LOG_LEVEL, 3, f"Solving instance {instance} ({instances_count}/{len(INSTANCES_LIST)})...")
-        if(USE_SOLVED_INSTANCES_LIST):
-            if instance in solved_instances_list:
-                print_solution_log(SOLUTION_LOG_LEVEL, 4, f"Skipped solved instance {instance}!")
-                instances_count += 1
-                continue
-        data = read_instance(instance)
-        solver = model[solver_alias](data)
-        solver.solve(
-            time=GUROBI_PARAMETERS["MAX_RUNTIME"],
-            log=GUROBI_PARAMETERS["PRINT_LOG"]
+Examples:
+    python main.py solve --solvers MTZ2 H2020 --instances berlin52-C-3-0-a.json --time-limit 600
+    python main.py solve --config run.toml --dry-run
+    python main.py sweep --solvers MTZ2 GP2 --groups small-clustered --seeds 5 --permutations 2 --cores 16
+    python main.py tune --solvers MTZ2 GP2 --groups small-clustered 100-clustered --time-limit 300 --tune-trials 12
+    python main.py list-instances --group 100-clustered --pattern "*-0-*"
+    python main.py status --config run.toml
+
+Values not given on the command line are taken from the config file (TOML or JSON,
+keys named as the long options, e.g. time_limit) and then from UserInputs.py.
+Heavy modules (gurobipy and the model classes) are only imported when a solve is dispatched.
+"""
+
+import os
+import sys
+import json
+import argparse
+
+COMMANDS = ["solve", "sweep", "tune", "list-instances", "list-solvers", "status"]
+
+CONFIG_KEYS = [
+    "solvers", "instances", "groups", "pattern", "time_limit", "print_log",
+    "export_solution", "datetime_on_filename", "use_solved_instances_list",
+    "log_level", "use_bounds", "rc_fixing", "export_events", "metrics_port", "workers",
+    "dp_lns_window", "model_cache", "model_cache_size_mb",
+    "sweep_seeds", "sweep_permutations", "cores", "threads_per_job",
+    "use_profiles", "tune_method", "tune_trials", "tune_instances", "lean"
+]
+
+def get_default_config():
+    """Returns the configuration given by UserInputs.py."""
+    import UserInputs
+
+    return {
+        "solvers": UserInputs.SOLVERS_LIST,
+        "instances": UserInputs.INSTANCES_LIST,
+        "groups": [],
+        "pattern": None,
+        "time_limit": UserInputs.GUROBI_PARAMETERS["MAX_RUNTIME"],
+        "print_log": UserInputs.GUROBI_PARAMETERS["PRINT_LOG"],
+        "use_bounds": UserInputs.GUROBI_PARAMETERS["USE_COMBINATORIAL_BOUNDS"],
+        "rc_fixing": UserInputs.GUROBI_PARAMETERS["REDUCED_COST_FIXING"],
+        "export_solution": UserInputs.EXPORT_SOLUTION_PARAMETERS["EXPORT_SOLUTION"],
+        "datetime_on_filename": UserInputs.EXPORT_SOLUTION_PARAMETERS["DATETIME_ON_FILENAME"],
+        "use_solved_instances_list": UserInputs.USE_SOLVED_INSTANCES_LIST,
+        "log_level": UserInputs.SOLUTION_LOG_LEVEL,
+        "export_events": UserInputs.EVENT_LOG_PARAMETERS["EXPORT_EVENTS"],
+        "metrics_port": UserInputs.EVENT_LOG_PARAMETERS["METRICS_PORT"],
+        "workers": UserInputs.PARALLEL_PARAMETERS["WORKERS"],
+        "dp_lns_window": UserInputs.GUROBI_PARAMETERS["DP_LNS_WINDOW"],
+        "model_cache": UserInputs.MODEL_CACHE_PARAMETERS["USE_MODEL_CACHE"],
+        "model_cache_size_mb": UserInputs.MODEL_CACHE_PARAMETERS["SIZE_LIMIT_MB"],
+        "sweep_seeds": UserInputs.SWEEP_PARAMETERS["SEEDS"],
+        "sweep_permutations": UserInputs.SWEEP_PARAMETERS["PERMUTATIONS"],
+        "cores": UserInputs.SWEEP_PARAMETERS["CORES"],
+        "threads_per_job": UserInputs.SWEEP_PARAMETERS["THREADS_PER_JOB"],
+        "use_profiles": UserInputs.TUNING_PARAMETERS["USE_PROFILES"],
+        "tune_method": UserInputs.TUNING_PARAMETERS["METHOD"],
+        "tune_trials": UserInputs.TUNING_PARAMETERS["TRIALS"],
+        "tune_instances": UserInputs.TUNING_PARAMETERS["INSTANCES_PER_SIZE_CLASS"],
+        "lean": UserInputs.GUROBI_PARAMETERS["LEAN_MODELS"]
+    }
+
+def load_config_file(path):
+    if(path.endswith(".toml")):
+        import tomllib
+
+        with open(path, "rb") as f:
+            config = tomllib.load(f)
+    else:
+        with open(path, "r") as f:
+            config = json.load(f)
+    unknown_keys = set(config) - set(CONFIG_KEYS)
+    if(len(unknown_keys) > 0):
+        raise ValueError(f"Unknown keys in config file {path}: {', '.join(sorted(unknown_keys))}")
+    return config
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Solve CTSP_d instances with the available formulations.")
+    parser.add_argument("command", nargs="?", default="solve", choices=COMMANDS)
+    parser.add_argument("-c", "--config", help="TOML or JSON configuration file")
+    parser.add_argument("-s", "--solvers", nargs="+", help="solver aliases (see list-solvers)")
+    parser.add_argument("-i", "--instances", nargs="+", help="instance file names")
+    parser.add_argument("-g", "--groups", nargs="+", help="instance groups of the catalog (see list-instances --help)")
+    parser.add_argument("-p", "--pattern", help="glob pattern filtering the selected (or all) instances")
+    parser.add_argument("-t", "--time-limit", type=float, dest="time_limit")
+    parser.add_argument("--log-level", type=int, dest="log_level")
+    parser.add_argument("--metrics-port", type=int, dest="metrics_port")
+    parser.add_argument("-w", "--workers", type=int, help="solver processes (sharing the distance matrices)")
+    parser.add_argument("--dp-lns-window", type=int, dest="dp_lns_window", help="improve the heuristic route of the bounds by the DP neighbourhood search")
+    parser.add_argument("--model-cache-size-mb", type=float, dest="model_cache_size_mb")
+    parser.add_argument("--seeds", type=int, dest="sweep_seeds", help="sweep: Gurobi seeds per job")
+    parser.add_argument("--permutations", type=int, dest="sweep_permutations", help="sweep: relabelings of the vertices per seed")
+    parser.add_argument("--cores", type=int, help="sweep: cores shared by the runs (default: all)")
+    parser.add_argument("--threads-per-job", type=int, dest="threads_per_job", help="sweep: Gurobi threads per run")
+    parser.add_argument("--tune-method", dest="tune_method", choices=["search", "gurobi"], help="tune: own parameter search or Gurobi's tuning tool")
+    parser.add_argument("--tune-trials", type=int, dest="tune_trials", help="tune: parameter sets tried (or tuning time in time limits, for gurobi)")
+    parser.add_argument("--tune-instances", type=int, dest="tune_instances", help="tune: training instances per size class")
+    parser.add_argument("--dry-run", action="store_true", help="only print the jobs that would be solved")
+    for option, help_msg in [
+        ("print-log", "print the Gurobi log"),
+        ("export-solution", "export the results to the Results folder"),
+        ("datetime-on-filename", "add the datetime to the results file names"),
+        ("use-solved-instances-list", "skip the instances already solved by each solver"),
+        ("use-bounds", "use the combinatorial bounds as Gurobi hints"),
+        ("rc-fixing", "fix arcs by the root LP reduced costs"),
+        ("export-events", "write the JSON lines event log"),
+        ("model-cache", "reuse the models built before (Model_Cache folder)"),
+        ("use-profiles", "apply the tuned Gurobi parameters (Tuning_Profiles folder)"),
+        ("lean", "release the constraint handles after building the models")
+    ]:
+        parser.add_argument(
+            f"--{option}", dest=option.replace("-", "_"), default=None,
+            action=argparse.BooleanOptionalAction, help=help_msg
+        )
+    return parser
+
+def resolve_config(args):
+    """Merges UserInputs.py, the config file and the command line (in increasing priority)."""
+    config = get_default_config()
+    file_config = load_config_file(args.config) if args.config is not None else dict()
+    config.update(file_config)
+    for key in CONFIG_KEYS:
+        value = getattr(args, key, None)
+        if(value is not None):
+            config[key] = value
+    given_instances = args.instances is not None or "instances" in file_config
+    given_groups = args.groups is not None or "groups" in file_config
+    if(given_groups and not given_instances):
+        config["instances"] = []
+    config["instances"] = select_instances(config, given_instances or given_groups)
+    return config
+
+def select_instances(config, explicit_instances=True):
+    """Returns the given instances plus the ones of the given groups, filtered by the pattern.
+    Without explicit instances or groups, the pattern filters the whole catalog."""
+    from InstancesUtils import load_instances_group, filter_instances_list
+
+    if(not explicit_instances and config["pattern"] is not None):
+        instances = load_instances_group("all")
+    else:
+        instances = list(config["instances"])
+        for group in config["groups"]:
+            instances += [item for item in load_instances_group(group) if item not in instances]
+    if(config["pattern"] is not None):
+        instances = filter_instances_list(config["pattern"], instances)
+    return instances
+
+def check_config(config):
+    from MiscUtils import AVAILABLE_MODELS
+    import PATHS
+
+    for solver_alias in config["solvers"]:
+        if(solver_alias not in AVAILABLE_MODELS):
+            raise SystemExit(f"Unknown solver alias {solver_alias}! Available: {', '.join(AVAILABLE_MODELS)}")
+    for instance in config["instances"]:
+        if(not os.path.isfile(os.path.join(PATHS.INSTANCES_FOLDER, instance))):
+            raise SystemExit(f"Instance {instance} not found in {PATHS.INSTANCES_FOLDER}!")
+
+def print_jobs(config):
+    from BatchRunner import plan_jobs
+
+    jobs = plan_jobs(config)
+    for solver_alias, instance, solved in jobs:
+        print(f"{solver_alias}\t{instance}\t{'skip (solved)' if solved else 'solve'}")
+    print(f"{sum(1 for job in jobs if not job[2])} jobs to solve, {sum(1 for job in jobs if job[2])} already solved.")
+
+def print_status(config):
+    from BatchRunner import get_solved_instances
+
+    selected = set(config["instances"])
+    for solver_alias in config["solvers"]:
+        solved = get_solved_instances(dict(config, use_solved_instances_list=True), solver_alias)
+        print(f"{solver_alias}: {len(solved & selected)}/{len(selected)} selected instances solved ({len(solved)} in total)")
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    config = resolve_config(args)
+
+    if(args.command == "list-solvers"):
+        from MiscUtils import AVAILABLE_MODELS
+
+        for solver_alias, (module_name, class_name) in AVAILABLE_MODELS.items():
+            print(f"{solver_alias}\t{module_name}.{class_name}")
+        return
+    if(args.command == "list-instances"):
+        from InstancesUtils import INSTANCES_GROUPS
+
+        if(args.instances is None and args.groups is None and args.pattern is None and args.config is None):
+            print("Groups: " + ", ".join(INSTANCES_GROUPS))
+            config["instances"] = select_instances(dict(config, instances=[], groups=["all"]))
+        for instance in config["instances"]:
+            print(instance)
+        return
+
+    check_config(config)
+    if(args.command == "status"):
+        print_status(config)
+    elif(args.dry_run):
+        print_jobs(config)
+    elif(args.command == "sweep"):
+        from SeedSweep import run_sweep
+
+        run_sweep(config)
+    elif(args.command == "tune"):
+        from EventLog import EventLog
+        from MiscUtils import get_events_log_path
+        from ParameterTuning import run_tuning
+
+        event_log = EventLog(
+            get_events_log_path() if config["export_events"] else None,
+            console_level=config["log_level"]
         )
-        instances_count += 1
-        if(EXPORT_SOLUTION_PARAMETERS["EXPORT_SOLUTION"]):
-            export_results(
-                solver,
-                EXPORT_SOLUTION_PARAMETERS["DATETIME_ON_FILENAME"]
-            )
-        if(USE_SOLVED_INSTANCES_LIST):
-            append_to_solved_instances_list(solver_alias, instance)
-            print_solution_log(SOLUTION_LOG_LEVEL, 4, f"Stored {instance} to {solver_alias} solved instances list!")
-    solver_count += 1
-
-print_solution_log(SOLUTION_LOG_LEVEL, 1, "Finished Solution Process!")
+        try:
+            run_tuning(config, event_log)
+        finally:
+            event_log.close()
+    else:
+        from BatchRunner import run_batch
+
+        run_batch(config)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
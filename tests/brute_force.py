@@ -0,0 +1,49 @@
+import itertools
+
+import numpy as np
+
+import CombinatorialBounds
+
+DIAGONAL = 99999
+
+def random_instance(rng, n, P, d, symmetric=True):
+    """Random CTSP_d instance on n vertices (vertex 0 is the depot) with P clusters, with
+    rounded euclidean distances (or random asymmetric ones) and the instances' diagonal."""
+    if(symmetric):
+        points = rng.integers(0, 100, size=(n, 2))
+        D = np.rint(np.linalg.norm(points[:, None] - points[None, :], axis=2)).astype(np.int32)
+    else:
+        D = rng.integers(1, 100, size=(n, n)).astype(np.int32)
+    np.fill_diagonal(D, DIAGONAL)
+    vertices = rng.permutation(np.arange(1, n))
+    cuts = np.sort(rng.choice(np.arange(1, n - 1), size=P - 1, replace=False))
+    V_P = [sorted(int(v) for v in part) for part in np.split(vertices, cuts)]
+    return {"distances": D, "V_P": V_P, "d": d, "instance_name": "random"}
+
+def route_is_feasible(route, cluster, d):
+    """Whether the route visits every vertex once respecting the d-relaxed priority rule."""
+    visits = route[1:-1]
+    if(route[0] != 0 or route[-1] != 0 or sorted(visits) != list(range(1, len(cluster)))):
+        return False
+    return all(cluster[a] <= cluster[b] + d for a, b in itertools.combinations(visits, 2))
+
+def optimal_length(data):
+    """Length of the optimal route, by enumerating every feasible order of the vertices."""
+    D = np.asarray(data["distances"])
+    cluster = CombinatorialBounds.get_vertex_cluster(data)
+    best = None
+    for order in itertools.permutations(range(1, len(D))):
+        route = [0, *order, 0]
+        if(route_is_feasible(route, cluster, data["d"])):
+            length = CombinatorialBounds.route_length(D, route)
+            if(best is None or length < best):
+                best = length
+    return best
+
+def shortest_path_length(Dc, entry, exit_vertex):
+    """Shortest Hamiltonian path from entry to exit_vertex of a cluster, by enumeration."""
+    inner = [v for v in range(len(Dc)) if v not in (entry, exit_vertex)]
+    return min(
+        CombinatorialBounds.route_length(Dc, [entry, *order, exit_vertex])
+        for order in itertools.permutations(inner)
+    )
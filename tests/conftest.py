@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules of the repository are imported by name, as main.py does.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
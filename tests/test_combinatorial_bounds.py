@@ -0,0 +1,42 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import CombinatorialBounds
+
+from brute_force import random_instance, route_is_feasible, optimal_length
+
+@pytest.mark.parametrize("seed", range(12))
+def test_bounds_enclose_the_optimum(seed):
+    rng = np.random.default_rng(seed)
+    data = random_instance(rng, int(rng.integers(5, 9)), int(rng.integers(1, 4)), int(rng.integers(0, 3)))
+    optimum = optimal_length(data)
+    bounds = CombinatorialBounds.compute_bounds(data)
+
+    assert bounds["assignment_bound"] <= optimum
+    assert bounds["one_tree_bound"] <= optimum + 1e-6
+    assert bounds["held_karp_bound"] <= optimum + 1e-6
+    assert bounds["lower_bound"] <= optimum <= bounds["upper_bound"]
+    cluster = CombinatorialBounds.get_vertex_cluster(data)
+    assert route_is_feasible(bounds["heuristic_route"], cluster, data["d"])
+    assert CombinatorialBounds.route_length(data["distances"], bounds["heuristic_route"]) == bounds["upper_bound"]
+
+@pytest.mark.parametrize("seed", range(6))
+def test_assignment_bound_on_asymmetric_distances(seed):
+    rng = np.random.default_rng(100 + seed)
+    data = random_instance(rng, 7, 2, int(rng.integers(0, 2)), symmetric=False)
+    cluster = CombinatorialBounds.get_vertex_cluster(data)
+    assert CombinatorialBounds.assignment_bound(data["distances"], cluster, 2, data["d"]) <= optimal_length(data)
+
+def test_feasible_arcs_contain_every_feasible_route():
+    rng = np.random.default_rng(7)
+    for _ in range(10):
+        d = int(rng.integers(0, 3))
+        data = random_instance(rng, 7, 4, d)
+        cluster = CombinatorialBounds.get_vertex_cluster(data)
+        feasible = CombinatorialBounds.feasible_arcs_matrix(cluster, 4, d)
+        for order in itertools.permutations(range(1, 7)):
+            route = [0, *order, 0]
+            if(route_is_feasible(route, cluster, d)):
+                assert all(feasible[a, b] for a, b in zip(route[:-1], route[1:]))
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+import CombinatorialBounds
+import Decomposition
+import DynamicProgramming
+
+from brute_force import random_instance, route_is_feasible, shortest_path_length
+
+def cluster_matrices(data):
+    D = np.asarray(data["distances"])
+    return [D[np.ix_(vertices, vertices)] for vertices in data["V_P"]]
+
+def exact_path_costs(Dc):
+    k = len(Dc)
+    costs = np.full((k, k), np.inf)
+    for entry in range(k):
+        costs[entry], _ = Decomposition.held_karp_paths(Dc, entry)
+    return costs
+
+@pytest.mark.parametrize("seed", range(8))
+def test_held_karp_paths_and_path_lower_bounds(seed):
+    rng = np.random.default_rng(seed)
+    k = int(rng.integers(3, 7))
+    Dc = random_instance(rng, k + 1, 1, 0, symmetric=bool(seed % 2))["distances"][1:, 1:]
+    bounds = Decomposition.path_lower_bounds(Dc)
+    for entry in range(k):
+        lengths, paths = Decomposition.held_karp_paths(Dc, entry)
+        for exit_vertex in range(k):
+            if(exit_vertex == entry):
+                assert lengths[exit_vertex] == np.inf and paths[exit_vertex] is None
+                continue
+            exact = shortest_path_length(Dc, entry, exit_vertex)
+            path = paths[exit_vertex]
+            assert lengths[exit_vertex] == exact
+            assert sorted(path) == list(range(k)) and path[0] == entry and path[-1] == exit_vertex
+            assert CombinatorialBounds.route_length(Dc, path) == exact
+            assert bounds[entry, exit_vertex] <= exact
+
+@pytest.mark.parametrize("seed", range(10))
+def test_chain_dp_matches_ordered_clusters_dp(seed):
+    rng = np.random.default_rng(seed)
+    data = random_instance(rng, int(rng.integers(4, 11)), int(rng.integers(1, 4)), 0, symmetric=bool(seed % 2))
+    D = data["distances"]
+    costs = [exact_path_costs(Dc) for Dc in cluster_matrices(data)]
+    length, pairs, values = Decomposition.chain_dp(D, data["V_P"], costs)
+    _, optimum = DynamicProgramming.ordered_clusters_dp(D, data["V_P"])
+    assert length == optimum
+    # values[p][a, b] is the best route through the pair (a, b) of cluster p.
+    for p, (a, b) in enumerate(pairs):
+        assert values[p][a, b] == optimum
+        assert values[p].min() == optimum
+
+@pytest.mark.parametrize("seed", range(6))
+def test_decomposition_with_path_subproblems_is_optimal(seed, monkeypatch):
+    def enumerated_path(Dc, entry, exit_vertex, cutoff=None, time_limit=None):
+        length = shortest_path_length(Dc, entry, exit_vertex)
+        if(cutoff is not None and length >= cutoff):
+            return "CUTOFF", cutoff, None
+        _, paths = Decomposition.held_karp_paths(Dc, entry)
+        return "OPTIMAL", length, paths[exit_vertex]
+
+    # Every cluster with more than 2 vertices is solved by path subproblems.
+    monkeypatch.setattr(Decomposition, "MAX_ARRAY_CLUSTER_SIZE", 2)
+    monkeypatch.setattr(Decomposition, "solve_path_mip", enumerated_path)
+    rng = np.random.default_rng(seed)
+    data = random_instance(rng, int(rng.integers(7, 11)), int(rng.integers(1, 3)), 0)
+    solver = Decomposition.Decomposition_CTSP_d_Model(data)
+    solver.solve(threads=1)
+    assert solver.subproblemsSolved > 0
+    _, optimum = DynamicProgramming.ordered_clusters_dp(data["distances"], data["V_P"])
+    assert solver.objVal == optimum
+    assert solver.getStatus() == DynamicProgramming.STATUS_OPTIMAL
+    assert route_is_feasible(solver.routeList, CombinatorialBounds.get_vertex_cluster(data), 0)
+    assert CombinatorialBounds.route_length(data["distances"], solver.routeList) == optimum
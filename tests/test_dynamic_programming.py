@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import CombinatorialBounds
+import DynamicProgramming
+
+from brute_force import random_instance, route_is_feasible, optimal_length
+
+@pytest.mark.parametrize("seed", range(12))
+def test_ordered_clusters_dp_is_optimal(seed):
+    rng = np.random.default_rng(seed)
+    data = random_instance(rng, int(rng.integers(4, 9)), int(rng.integers(1, 4)), 0, symmetric=bool(seed % 2))
+    route, length = DynamicProgramming.ordered_clusters_dp(data["distances"], data["V_P"])
+    assert length == optimal_length(data)
+    assert route_is_feasible(route, CombinatorialBounds.get_vertex_cluster(data), 0)
+    assert CombinatorialBounds.route_length(data["distances"], route) == length
+
+@pytest.mark.parametrize("seed", range(12))
+def test_restricted_dp_is_optimal_without_state_limit(seed):
+    rng = np.random.default_rng(seed)
+    data = random_instance(rng, int(rng.integers(4, 9)), int(rng.integers(1, 4)), int(rng.integers(0, 3)), symmetric=bool(seed % 2))
+    cluster = CombinatorialBounds.get_vertex_cluster(data)
+    route, length, exact = DynamicProgramming.restricted_dp(data["distances"], cluster, data["V_P"], data["d"])
+    assert exact
+    assert length == optimal_length(data)
+    assert route_is_feasible(route, cluster, data["d"])
+    assert CombinatorialBounds.route_length(data["distances"], route) == length
+
+@pytest.mark.parametrize("seed", range(6))
+def test_restricted_dp_beam_and_neighbourhood_give_feasible_routes(seed):
+    rng = np.random.default_rng(50 + seed)
+    data = random_instance(rng, 9, 3, int(rng.integers(0, 3)))
+    D = data["distances"]
+    cluster = CombinatorialBounds.get_vertex_cluster(data)
+    optimum = optimal_length(data)
+
+    route, length, _ = DynamicProgramming.restricted_dp(D, cluster, data["V_P"], data["d"], max_states=3)
+    assert route_is_feasible(route, cluster, data["d"])
+    assert CombinatorialBounds.route_length(D, route) == length >= optimum
+
+    start = CombinatorialBounds.heuristic_route(D, cluster, 3, data["d"])
+    route, length = DynamicProgramming.improve_route(D, cluster, data["V_P"], data["d"], start, window=3)
+    assert route_is_feasible(route, cluster, data["d"])
+    assert optimum <= CombinatorialBounds.route_length(D, route) == length <= CombinatorialBounds.route_length(D, start)